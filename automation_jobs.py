@@ -0,0 +1,320 @@
+import codecs
+import itertools
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+READ_CHUNK_SIZE = 4096
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+
+
+class OutputBuffer:
+    """
+    Bounded ring buffer of a job's output.
+
+    Chunks from stdout and stderr are decoded once as they arrive and
+    stored with an increasing sequence number. Once more than `max_chars`
+    characters are held the oldest chunks are dropped, so memory per job
+    stays capped however much the script prints. Readers block in read()
+    until chunks newer than the last sequence they saw arrive.
+    """
+
+    def __init__(self, max_chars=DEFAULT_OUTPUT_LIMIT):
+        self.max_chars = max_chars
+        self.dropped = 0
+        self.closed = False
+        self._chunks = deque()
+        self._size = 0
+        self._next_seq = 0
+        self._cond = threading.Condition()
+
+    def append(self, stream, text):
+        if not text:
+            return
+        with self._cond:
+            self._chunks.append((self._next_seq, stream, text))
+            self._next_seq += 1
+            self._size += len(text)
+            while self._size > self.max_chars and len(self._chunks) > 1:
+                _, _, dropped = self._chunks.popleft()
+                self._size -= len(dropped)
+                self.dropped += len(dropped)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def read(self, after=-1, timeout=None):
+        """(chunks newer than `after`, closed), waits up to timeout for new output"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.closed or (self._chunks and self._chunks[-1][0] > after),
+                timeout=timeout,
+            )
+            return [chunk for chunk in self._chunks if chunk[0] > after], self.closed
+
+    def text(self, stream):
+        with self._cond:
+            return "".join(text for _, chunk_stream, text in self._chunks if chunk_stream == stream)
+
+
+class Job:
+    """One automation script run"""
+
+    def __init__(self, command, cwd=None):
+        self.id = uuid.uuid4().hex
+        self.command = command
+        self.cwd = cwd
+        self.status = "queued"
+        self.returncode = None
+        self.output = OutputBuffer()
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def stdout(self):
+        return self.output.text("stdout")
+
+    @property
+    def stderr(self):
+        return self.output.text("stderr")
+
+    @property
+    def done(self):
+        return self.status in ("finished", "failed")
+
+    def to_dict(self, output=False):
+        data = {
+            "id": self.id,
+            "command": self.command,
+            "status": self.status,
+            "returncode": self.returncode,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if output:
+            data["stdout"] = self.stdout
+            data["stderr"] = self.stderr
+            data["truncated_chars"] = self.output.dropped
+        return data
+
+
+class JobRegistry:
+    """
+    Runs automation scripts in the background.
+
+    At most `max_workers` child processes run at a time, further jobs wait
+    in the executor queue. The registry remembers the last `max_jobs` jobs
+    so their status and output can be fetched after the request returned.
+    Jobs submitted without their own `cwd` share the working directory, so
+    only raise `max_workers` when every job gets one.
+    """
+
+    def __init__(self, max_workers=1, max_jobs=200):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="automation-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, command, cwd=None):
+        job = Job(command, cwd)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            process = subprocess.Popen(
+                job.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=job.cwd
+            )
+            readers = [
+                threading.Thread(target=pump, args=(process.stdout, "stdout", job.output), daemon=True),
+                threading.Thread(target=pump, args=(process.stderr, "stderr", job.output), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+            job.returncode = process.wait()
+            for reader in readers:
+                reader.join()
+            job.status = "finished"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.output.close()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_jobs"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in itertools.islice(finished, excess):
+            del self._jobs[job_id]
+
+
+def pump(pipe, stream, output):
+    """Copy a child pipe into the output buffer chunk by chunk"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    fd = pipe.fileno()
+    try:
+        while True:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            output.append(stream, decoder.decode(chunk))
+        output.append(stream, decoder.decode(b"", final=True))
+    finally:
+        pipe.close()
+
+
+# flavors a job_type=all run walks through one after another
+FLAVORS = ("Standard", "Static", "HVD", "SQL")
+
+
+def expand_matrix(flavors, model_types, pnics, skip_types=()):
+    """Every flavor x model_type x pnics combination not skipped"""
+    return [
+        {"job_type": flavor, "model_type": model_type, "pnics": pnic}
+        for flavor in flavors
+        if flavor not in skip_types
+        for model_type in model_types
+        for pnic in pnics
+    ]
+
+
+def cell_name(params):
+    return "-".join(str(value) for value in params.values() if value)
+
+
+class MatrixCell:
+    """One combination of a matrix run, executed as its own job"""
+
+    def __init__(self, params, job):
+        self.params = params
+        self.job = job
+
+    @property
+    def name(self):
+        return cell_name(self.params)
+
+    @property
+    def result(self):
+        if not self.job.done:
+            return self.job.status
+        return "passed" if self.job.status == "finished" and self.job.returncode == 0 else "failed"
+
+    def to_dict(self):
+        return {"name": self.name, "params": self.params, "result": self.result, "job": self.job.to_dict()}
+
+
+class Matrix:
+    """A set of cells submitted together, with an aggregated summary"""
+
+    def __init__(self, root):
+        self.id = uuid.uuid4().hex
+        self.root = os.path.join(root, self.id)
+        self.cells = []
+        self.created_at = time.time()
+
+    @property
+    def done(self):
+        return all(cell.job.done for cell in self.cells)
+
+    def summary(self):
+        counts = {"queued": 0, "running": 0, "passed": 0, "failed": 0}
+        for cell in self.cells:
+            counts[cell.result] += 1
+        started = [cell.job.started_at for cell in self.cells if cell.job.started_at]
+        finished = [cell.job.finished_at for cell in self.cells if cell.job.finished_at]
+        durations = {
+            cell.name: cell.job.finished_at - cell.job.started_at
+            for cell in self.cells
+            if cell.job.started_at and cell.job.finished_at
+        }
+        if not self.done:
+            status = "running" if started else "queued"
+        else:
+            status = "failed" if counts["failed"] else "passed"
+        return {
+            "status": status,
+            "total": len(self.cells),
+            "counts": counts,
+            "started_at": min(started) if started else None,
+            "finished_at": max(finished) if self.done and finished else None,
+            "wall_time": max(finished) - min(started) if self.done and started else None,
+            "slowest": max(durations, key=durations.get) if durations else None,
+            "cell_time": sum(durations.values()),
+        }
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "summary": self.summary(),
+            "cells": [cell.to_dict() for cell in self.cells],
+        }
+
+
+class MatrixRegistry:
+    """
+    Runs matrices of automation scripts.
+
+    Every cell gets its own working directory under `root`, so the log
+    file the script writes next to itself stays separate per cell. Cells
+    of all matrices share one pool of `max_parallel` child processes,
+    which caps how many deployments run against the lab at once.
+    """
+
+    def __init__(self, root, max_parallel=4, max_matrices=50):
+        self.root = os.path.abspath(root)
+        self.max_matrices = max_matrices
+        self.jobs = JobRegistry(max_workers=max_parallel, max_jobs=max_matrices * 64)
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, cells, build_command):
+        """Queue one job per cell params dict, build_command(params) gives its argv"""
+        matrix = Matrix(self.root)
+        for params in cells:
+            cwd = os.path.join(matrix.root, cell_name(params))
+            os.makedirs(cwd, exist_ok=True)
+            matrix.cells.append(MatrixCell(params, self.jobs.submit(build_command(params), cwd=cwd)))
+        with self._lock:
+            self._matrices[matrix.id] = matrix
+            excess = len(self._matrices) - self.max_matrices
+            finished = [matrix_id for matrix_id, old in self._matrices.items() if old.done]
+            for matrix_id in itertools.islice(finished, max(excess, 0)):
+                del self._matrices[matrix_id]
+        return matrix
+
+    def get(self, matrix_id):
+        with self._lock:
+            return self._matrices.get(matrix_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._matrices.values())
@@ -0,0 +1,245 @@
+import fcntl
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# shared results older than this are removed from shared_dir
+SHARED_MAX_AGE = 60 * 60
+# number of lock files in shared_dir, keys hash onto one of them
+SHARED_LOCK_STRIPES = 256
+
+
+class LRUCache:
+    """
+    Thread safe in-process LRU cache.
+
+    Bounded by number of entries and, when `max_size` is set, by the sum of
+    the sizes given to put(). Entries older than `ttl` seconds are treated
+    as missing. Used for per-worker caches of parsed task payloads.
+    """
+
+    __slots__ = ("max_entries", "max_size", "ttl", "size", "_entries", "_lock")
+
+    def __init__(self, max_entries=8, max_size=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, size, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._pop(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, size=0):
+        if self.max_size is not None and size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self.size += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_size is not None and self.size > self.max_size)
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into a single execution.
+
+    Callers that arrive while a call is in flight block until it finishes
+    and share its value (or exception). A finished value keeps being
+    returned for `fresh_for` seconds.
+
+    Without `shared_dir` deduplication is per process, which only covers
+    the threads/greenlets of one worker. Under the prefork pool concurrent
+    tasks run in different child processes, so pass a `shared_dir` on a
+    local disk: the in-process leader then takes a file lock for the key
+    and publishes its value there, and a leader in another child that
+    waited on the lock reuses that value instead of calling fn again.
+    Workers on different hosts still call fn once per host.
+    """
+
+    __slots__ = ("max_entries", "_flights", "_recent", "_lock")
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._flights = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, fresh_for=0, shared_dir=None, **kwargs):
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None and time.monotonic() - recent[1] <= fresh_for:
+                return recent[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            if shared_dir:
+                flight.value = call_shared(shared_dir, key, fresh_for, fn, *args, **kwargs)
+            else:
+                flight.value = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and fresh_for:
+                    self._recent[key] = (flight.value, time.monotonic())
+                    self._recent.move_to_end(key)
+                    while len(self._recent) > self.max_entries:
+                        self._recent.popitem(last=False)
+            flight.done.set()
+        return flight.value
+
+    def forget(self, key=None):
+        """Drop remembered results for key, or all of them"""
+        with self._lock:
+            if key is None:
+                self._recent.clear()
+            else:
+                self._recent.pop(key, None)
+
+
+def call_shared(shared_dir, key, fresh_for, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) at most once across the processes sharing
+    `shared_dir` while a call for `key` is running.
+
+    The call runs under an exclusive lock. A value published after this
+    caller arrived, or within the last `fresh_for` seconds, is returned
+    instead of calling fn.
+    """
+    arrived = time.time()
+    if not _private_dir(shared_dir):
+        # files in shared_dir are unpickled, never read them from a directory others can write
+        logger.warning("Not sharing results through %s, it is owned by another user", shared_dir)
+        return fn(*args, **kwargs)
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    path = os.path.join(shared_dir, f"flight-{digest}.pickle")
+    lock_path = os.path.join(shared_dir, f"flight-{int(digest, 16) % SHARED_LOCK_STRIPES}.lock")
+    with open(lock_path, "a+b") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # one second of slack for coarse file system timestamps
+            value = _load_shared(path, arrived - fresh_for - 1)
+            if value is not _MISSING:
+                return value
+            value = fn(*args, **kwargs)
+            _store_shared(shared_dir, path, value)
+            return value
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _private_dir(path):
+    """Create `path` with mode 0700, tighten it when it is ours but more open"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        return False
+    if stat.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return True
+
+
+def _load_shared(path, not_before):
+    try:
+        if os.path.getmtime(path) < not_before:
+            return _MISSING
+        with open(path, "rb") as shared_file:
+            return pickle.load(shared_file)
+    except FileNotFoundError:
+        return _MISSING
+    except Exception:
+        # unreadable or partially collected, call fn again
+        return _MISSING
+
+
+def _store_shared(shared_dir, path, value):
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=shared_dir, delete=False) as tmp_file:
+            tmp_name = tmp_file.name
+            pickle.dump(value, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, path)
+    except Exception as e:
+        # the caller still gets its value, waiters in other processes
+        # fall back to calling fn themselves
+        logger.warning("Could not share result through %s: %s", shared_dir, e)
+        if tmp_name:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+        return
+    now = time.time()
+    with os.scandir(shared_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".pickle") and entry.name.startswith("flight-"):
+                try:
+                    if now - entry.stat().st_mtime > SHARED_MAX_AGE:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
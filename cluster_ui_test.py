@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+
+import pytest
+
+from automation_jobs import FLAVORS, JobRegistry, MatrixRegistry, expand_matrix
+from log_reader import FileView, read_window
+from log_tail import POLL_INTERVAL, LogTailer
+
+
+def append(path, text):
+    with open(path, "a") as logfile:
+        logfile.write(text)
+
+
+class TestLogTailer:
+
+    def test_broadcasts_new_lines_with_end_offsets(self, tmp_path):
+        path = tmp_path / "logfile.txt"
+        path.write_text("old\n")
+        tailer = LogTailer(str(path))
+        subscriber, offset = tailer.subscribe()
+        try:
+            assert offset == 4
+            append(path, "new1\nnew")
+            assert subscriber.get(timeout=5) == (9, "new1")
+            append(path, "2\n")
+            assert subscriber.get(timeout=5) == (14, "new2")
+        finally:
+            tailer.unsubscribe(subscriber)
+
+    def test_rotated_file_counts_offsets_from_its_start(self, tmp_path):
+        path = tmp_path / "logfile.txt"
+        path.write_text("old1\nold2\n")
+        tailer = LogTailer(str(path))
+        subscriber, _ = tailer.subscribe()
+        try:
+            append(path, "old3\n")
+            assert subscriber.get(timeout=5) == (15, "old3")
+            os.rename(path, tmp_path / "logfile.txt.1")
+            path.write_text("")
+            # let the reader reopen the empty file before the first line
+            time.sleep(3 * POLL_INTERVAL)
+            append(path, "new1\n")
+            assert subscriber.get(timeout=5) == (5, "new1")
+            late_subscriber, offset = tailer.subscribe()
+            tailer.unsubscribe(late_subscriber)
+            assert offset == 5
+        finally:
+            tailer.unsubscribe(subscriber)
+
+    def test_offset_is_reset_when_the_last_subscriber_leaves(self, tmp_path):
+        path = tmp_path / "logfile.txt"
+        path.write_text("old\n")
+        tailer = LogTailer(str(path))
+        subscriber, _ = tailer.subscribe()
+        thread = tailer._thread
+        tailer.unsubscribe(subscriber)
+        thread.join(timeout=5)
+
+        append(path, "written while nobody listened\n")
+        subscriber, offset = tailer.subscribe()
+        try:
+            assert offset == os.path.getsize(path)
+        finally:
+            tailer.unsubscribe(subscriber)
+
+
+class TestReadWindow:
+
+    def write_log(self, tmp_path, count):
+        path = tmp_path / "logfile.txt"
+        path.write_text("".join(f"step {i} (ok)\n" for i in range(count)))
+        return str(path)
+
+    def test_tail_and_page_backwards(self, tmp_path):
+        path = self.write_log(tmp_path, 30)
+        tail = read_window(path, lines=10)
+        assert tail["lines"] == [f"step {i} (ok)" for i in range(20, 30)]
+        assert tail["end_offset"] == tail["size"]
+
+        older = read_window(path, lines=10, before=tail["start_offset"])
+        assert older["lines"] == [f"step {i} (ok)" for i in range(10, 20)]
+        assert older["end_offset"] == tail["start_offset"]
+        assert older["has_more_before"]
+
+    def test_line_and_offset_anchors(self, tmp_path):
+        path = self.write_log(tmp_path, 3000)
+        assert read_window(path, lines=2, line=2500)["lines"] == ["step 2500 (ok)", "step 2501 (ok)"]
+        first = read_window(path, lines=1, offset=0)
+        # an offset inside a line starts at the next complete one
+        assert read_window(path, lines=1, offset=3)["lines"] == ["step 1 (ok)"]
+        assert read_window(path, lines=1, offset=first["end_offset"])["lines"] == ["step 1 (ok)"]
+
+    def test_grep_matches_literal_text(self, tmp_path):
+        path = self.write_log(tmp_path, 30)
+        assert read_window(path, lines=3, grep="step 2")["lines"] == [
+            "step 27 (ok)", "step 28 (ok)", "step 29 (ok)"
+        ]
+        assert read_window(path, lines=2, grep="9 (ok")["lines"] == ["step 19 (ok)", "step 29 (ok)"]
+        assert read_window(path, grep="(a+)+$")["lines"] == []
+
+    def test_missing_file(self, tmp_path):
+        assert read_window(str(tmp_path / "missing.txt")) is None
+
+    @pytest.mark.parametrize("anchor", ["line", "offset", "before"])
+    def test_negative_anchor_is_rejected(self, tmp_path, anchor):
+        path = self.write_log(tmp_path, 3)
+        with pytest.raises(ValueError, match=anchor):
+            read_window(path, **{anchor: -1})
+        assert read_window(path, lines=-5)["lines"] == ["step 2 (ok)"]
+
+    def test_file_view_matches_bytes_across_blocks(self, tmp_path):
+        path = self.write_log(tmp_path, 50)
+        content = open(path, "rb").read()
+        with open(path, "rb") as logfile:
+            data = FileView(logfile.fileno(), len(content), block=7)
+            assert data[3:40] == content[3:40]
+            assert data.find(b"\n", 5) == content.find(b"\n", 5)
+            assert data.rfind(b"\n", 0, 100) == content.rfind(b"\n", 0, 100)
+            assert data.find(b"x") == -1
+
+    def test_file_truncated_while_reading(self, tmp_path):
+        path = self.write_log(tmp_path, 100)
+        size = os.path.getsize(path)
+        with open(path, "rb") as logfile:
+            data = FileView(logfile.fileno(), size)
+            os.truncate(path, 10)
+            # an mmap of the old size would raise SIGBUS here
+            assert data.find(b"\n", 20) == -1
+            assert data[0:size] == b"step 0 (ok"
+            assert data.rfind(b"\n") == -1
+
+
+def wait_for(job):
+    after = -1
+    while True:
+        chunks, closed = job.output.read(after, timeout=10)
+        if closed:
+            return job
+        after = chunks[-1][0] if chunks else after
+
+
+class TestAutomationJobs:
+
+    def test_job_output_and_returncode(self):
+        jobs = JobRegistry(max_workers=1)
+        job = jobs.submit([sys.executable, "-c", "import sys; print('deployed'); sys.exit(3)"])
+        wait_for(job)
+        assert job.status == "finished"
+        assert job.returncode == 3
+        assert job.stdout == "deployed\n"
+        assert jobs.get(job.id) is job
+
+    def test_jobs_without_cwd_run_one_at_a_time(self, tmp_path):
+        jobs = JobRegistry()
+        script = (
+            "import time; log = open('logfile.txt', 'a'); log.write('start\\n'); log.flush(); "
+            "time.sleep(0.2); log.write('end\\n')"
+        )
+        submitted = [jobs.submit([sys.executable, "-c", script], cwd=str(tmp_path)) for _ in range(2)]
+        for job in submitted:
+            wait_for(job)
+        assert (tmp_path / "logfile.txt").read_text().split() == ["start", "end", "start", "end"]
+
+    def test_expand_matrix_skips_flavors(self):
+        cells = expand_matrix(FLAVORS, ["HC5", "HC6"], ["2pnic"], skip_types=["HVD", "SQL"])
+        assert [(cell["job_type"], cell["model_type"]) for cell in cells] == [
+            ("Standard", "HC5"), ("Standard", "HC6"), ("Static", "HC5"), ("Static", "HC6"),
+        ]
+
+    def test_matrix_cell_command_uses_absolute_paths(self, tmp_path, monkeypatch):
+        from werkzeug.datastructures import MultiDict
+        from test_cluster_ui import build_command
+
+        monkeypatch.chdir(tmp_path)
+        form = MultiDict({"job_env": "lab", "job_type": "all", "extra_vars_file": "vars/lab.yml"})
+        command = build_command(form, {"job_type": "Static", "model_type": "HC5", "pnics": "2pnic"})
+        assert os.path.isabs(command[1])
+        assert command[command.index("--extra_vars_file") + 1] == str(tmp_path / "vars" / "lab.yml")
+        # a single job runs where the server runs, its paths stay as given
+        assert "vars/lab.yml" in build_command(form)
+
+    def test_matrix_cells_run_in_their_own_directories(self, tmp_path):
+        matrices = MatrixRegistry(str(tmp_path), max_parallel=2)
+        script = (
+            "import sys; open('logfile.txt', 'w').write(sys.argv[1]); "
+            "sys.exit(1 if sys.argv[1] == 'SQL' else 0)"
+        )
+        cells = expand_matrix(FLAVORS, ["HC5"], ["2pnic"], skip_types=["HVD"])
+        matrix = matrices.submit(cells, lambda cell: [sys.executable, "-c", script, cell["job_type"]])
+        for cell in matrix.cells:
+            wait_for(cell.job)
+
+        summary = matrix.summary()
+        assert summary["status"] == "failed"
+        assert summary["counts"] == {"queued": 0, "running": 0, "passed": 2, "failed": 1}
+        for cell in matrix.cells:
+            with open(os.path.join(cell.job.cwd, "logfile.txt")) as logfile:
+                assert logfile.read() == cell.params["job_type"]
+        assert matrices.get(matrix.id) is matrix
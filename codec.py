@@ -0,0 +1,135 @@
+"""
+Compact binary codec for Ok/Err/Some/Nothing across Celery.
+
+Results and Maybes are encoded as msgpack extension types so a task can
+return a Result and the next task receives the same Ok/Err instead of an
+unwrapped value. Register once per process, then opt in per app or task:
+
+    register_result_serializer()
+    app.conf.update(
+        task_serializer="pbv",
+        result_serializer="pbv",
+        accept_content=["pbv", "json"],
+    )
+
+Enums registered with register_enum() decode to the same member, any
+other Enum is sent as its plain value.
+
+msgpack is an optional dependency, only needed when the codec is used.
+"""
+from datetime import date, datetime
+from enum import Enum
+
+from kombu.serialization import register
+
+from cca_pbv.library.results.result import Ok, Err
+from cca_pbv.library.maybe import Some, Nothing
+
+try:
+    import msgpack
+except ImportError:  # optional, only required by this codec
+    msgpack = None
+
+SERIALIZER_NAME = "pbv"
+CONTENT_TYPE = "application/x-pbv-msgpack"
+
+EXT_OK = 1
+EXT_ERR = 2
+EXT_SOME = 3
+EXT_NOTHING = 4
+EXT_TUPLE = 5
+EXT_DATETIME = 6
+EXT_DATE = 7
+EXT_ENUM = 8
+
+_PLAIN_TYPES = (dict, list, str, bytes, int, float)
+
+# "module:qualname" -> Enum class, only these are rebuilt on decode
+_ENUMS = {}
+
+
+def _enum_key(enum_class):
+    return f"{enum_class.__module__}:{enum_class.__qualname__}"
+
+
+def register_enum(enum_class):
+    """Round-trip members of enum_class through the codec, usable as a decorator"""
+    _ENUMS[_enum_key(enum_class)] = enum_class
+    return enum_class
+
+
+def _default(obj):
+    if isinstance(obj, Ok):
+        return msgpack.ExtType(EXT_OK, dumps(obj.ok_val))
+    if isinstance(obj, Err):
+        return msgpack.ExtType(EXT_ERR, dumps(obj.err_val))
+    if isinstance(obj, Some):
+        return msgpack.ExtType(EXT_SOME, dumps(obj.value))
+    if isinstance(obj, Nothing):
+        return msgpack.ExtType(EXT_NOTHING, b"")
+    if isinstance(obj, tuple):
+        return msgpack.ExtType(EXT_TUPLE, dumps(list(obj)))
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, Enum):
+        key = _enum_key(type(obj))
+        if key in _ENUMS:
+            return msgpack.ExtType(EXT_ENUM, dumps([key, obj.value]))
+        return obj.value
+    # strict_types sends subclasses (OrderedDict, str enums...) here
+    for plain_type in _PLAIN_TYPES:
+        if isinstance(obj, plain_type):
+            return plain_type(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__} with the {SERIALIZER_NAME} codec")
+
+
+def _ext_hook(code, data):
+    if code == EXT_OK:
+        return Ok(loads(data))
+    if code == EXT_ERR:
+        return Err(loads(data))
+    if code == EXT_SOME:
+        return Some(loads(data))
+    if code == EXT_NOTHING:
+        return Nothing()
+    if code == EXT_TUPLE:
+        return tuple(loads(data))
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == EXT_ENUM:
+        key, value = loads(data)
+        enum_class = _ENUMS.get(key)
+        return enum_class(value) if enum_class is not None else value
+    return msgpack.ExtType(code, data)
+
+
+def dumps(obj):
+    if msgpack is None:
+        raise ImportError(f"The {SERIALIZER_NAME} serializer requires msgpack")
+    return msgpack.packb(obj, default=_default, use_bin_type=True, strict_types=True)
+
+
+def loads(data):
+    if msgpack is None:
+        raise ImportError(f"The {SERIALIZER_NAME} serializer requires msgpack")
+    return msgpack.unpackb(
+        bytes(data) if isinstance(data, memoryview) else data,
+        ext_hook=_ext_hook,
+        raw=False,
+        strict_map_key=False,
+    )
+
+
+def register_result_serializer():
+    """Register the codec with kombu under SERIALIZER_NAME"""
+    register(
+        SERIALIZER_NAME,
+        dumps,
+        loads,
+        content_type=CONTENT_TYPE,
+        content_encoding="binary",
+    )
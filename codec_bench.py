@@ -0,0 +1,60 @@
+"""
+Compare the pbv codec with JSON and pickle on typical module results.
+
+    python codec_bench.py [hosts ...]
+
+JSON encodes the unwrapped ok_val, which is what tasks send today after
+`.expects()`. pickle and pbv encode the Ok itself.
+"""
+import json
+import pickle
+import sys
+import timeit
+
+from cca_pbv.library.results.result import Ok
+from cca_pbv.library.results.codec import dumps, loads
+
+
+def module_result(hosts, plugins=40):
+    return Ok({
+        f"esx{h:04}.example.com": [
+            {
+                "tag": f"plugin_{p}",
+                "description": f"Check number {p}",
+                "fail": p % 7 == 0,
+                "fail_data": {"expected": "enabled", "actual": "disabled"} if p % 7 == 0 else None,
+                "pass_data": None if p % 7 == 0 else {"value": "enabled"},
+                "start_time": "2024-01-01T00:00:00",
+                "finish_time": "2024-01-01T00:00:01",
+            }
+            for p in range(plugins)
+        ]
+        for h in range(hosts)
+    })
+
+
+CODECS = {
+    "json": (lambda r: json.dumps(r.ok_val).encode(), lambda b: Ok(json.loads(b))),
+    "pickle": (lambda r: pickle.dumps(r, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    "pbv": (dumps, loads),
+}
+
+
+def bench(hosts, repeat=5):
+    result = module_result(hosts)
+    number = max(1, 200 // hosts)
+    for name, (encode, decode) in CODECS.items():
+        data = encode(result)
+        enc = min(timeit.repeat(lambda: encode(result), number=number, repeat=repeat)) / number
+        dec = min(timeit.repeat(lambda: decode(data), number=number, repeat=repeat)) / number
+        print(f"{hosts:>6} hosts  {name:<7} {len(data):>10} bytes  "
+              f"encode {enc * 1e3:8.2f} ms  decode {dec * 1e3:8.2f} ms")
+
+
+def main(argv):
+    for hosts in [int(a) for a in argv[1:]] or [10, 100, 1000]:
+        bench(hosts)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+try:
+    from celery import Celery
+
+    from cca_pbv.library.environment import Envars
+    from cca_pbv.library.hashivault import Hashivault
+    from cca_pbv.application_container import Application
+    from cca_pbv.workers.tasks import (
+        extra_vars_cache,
+        invalidate_baseline_cache,
+        data_collection_flight,
+        report_status_buffer,
+    )
+    from cca_pbv.workers.base import BaseTask
+except ImportError:
+    # the automation UI tests run without the worker dependencies, the
+    # fixtures below are only used by tasks_test.py and tasks_bench.py
+    pass
+
+
+def clear_worker_state():
+    extra_vars_cache.clear()
+    invalidate_baseline_cache()
+    data_collection_flight.forget()
+    report_status_buffer.clear()
+
+
+@pytest.fixture()
+def clear_worker_caches():
+    clear_worker_state()
+    yield
+    clear_worker_state()
+
+
+@pytest.fixture()
+def container():
+    container = Application()
+    hashi_mock = MagicMock(spec=Hashivault)
+    envars_mock = MagicMock(spec=Envars)
+    envars_mock.get_else.side_effect = lambda key, default=None: default
+    container.core.hashi.override(hashi_mock)
+    container.core.environment.override(envars_mock)
+    container.wire(modules=["cca_pbv.workers.base"])
+    yield container, hashi_mock, envars_mock
+    container.unwire()
+
+
+@pytest.fixture()
+def test_celery_app(container):
+    app = Celery()
+    app.conf.update(
+        broker_url="memory://",
+        result_backend="cache+memory://",
+        task_always_eager=True,
+        task_eager_propagate=True,
+    )
+    app.task_cls = BaseTask
+    return app
@@ -1,10 +1,10 @@
 import logging
 from abc import ABC
+from datetime import datetime, timedelta, timezone
 
-from dependency_injector.wiring import inject, Provide
-from cca_pbv.library.container import Application
-from cca_pbv.library.results.result import Result, Ok, Err, result_wrap
-from cca_pbv.library.db.repository.result_repository_sync import ResultRepository
+from cca_pbv.library.results.result import (
+    Result, Ok, Err, result_wrap, ResultService, ResultFlusher, batched,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -105,30 +105,23 @@ def result_wrap(msg=None):
     return wrap_fn
 
 
-class ResultService:
+def prepare_result(result, error_id, category, target, env_id, elapsed, start_time=None, finish_time=None):
     """
-    Result Tracker manages the state of a report allowing for CRUD operations
+    finish_time defaults to now in UTC and start_time to finish_time minus
+    `elapsed` (seconds or a timedelta), callers with their own measurement,
+    e.g. the Timing returned by instrumentation.timed(), can pass both.
     """
-
-    __slots__ = ("result_repository",)
-
-    @inject
-    def __init__(self, result_repository: ResultRepository = Provide[Application.result_repository]):
-        self.result_repository = result_repository
-
-    def save_results(self, results: list[Result]):
-        if results:
-            self.result_repository.bulk_add(results)
-
-
-def prepare_result(result, error_id, category, target, env_id, elapsed):
+    finish_time = finish_time or datetime.now(timezone.utc)
+    if start_time is None:
+        duration = elapsed if isinstance(elapsed, timedelta) else timedelta(seconds=elapsed or 0)
+        start_time = finish_time - duration
     return Ok({
         "error_id": error_id,
         "category": category,
         "target": target,
         "env_id": env_id,
         "result": result,
-        "start_time": get_datetime_timestamp_now(),
-        "finish_time": get_datetime_timestamp_now(),
+        "start_time": start_time,
+        "finish_time": finish_time,
         "elapsed": elapsed
     })
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from cca_pbv.workers.payload_store import REF_KEY, is_payload_ref
+
+logger = logging.getLogger(__name__)
+
+# key used when a module is fingerprinted as a whole instead of per host
+WHOLE_TARGET = "__all__"
+
+
+def payload_fingerprint(value):
+    """Stable content hash of a JSON-like payload or a payload reference"""
+    if is_payload_ref(value):
+        return value[REF_KEY]
+    encoded = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def host_fingerprint(host_slice, baseline_fingerprint):
+    return hashlib.sha256(
+        f"{payload_fingerprint(host_slice)}:{baseline_fingerprint}".encode()
+    ).hexdigest()
+
+
+class ValidationCache:
+    """
+    Last validated results per vCenter, validator and module params (e.g.
+    the cluster), with the fingerprint of the inputs they were computed
+    from:
+
+        {target: {"fingerprint": "<sha256>", "results": [...]}}
+
+    Stored as one pickle per vCenter/validator/params under `root`.
+    """
+
+    __slots__ = ("root",)
+
+    def __init__(self, root):
+        self.root = root
+
+    def load(self, vcenter, validator_name, params=None):
+        path = self._path(vcenter, validator_name, params)
+        try:
+            with open(path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Ignoring unreadable validation cache %s: %s", path, e)
+            return {}
+
+    def store(self, vcenter, validator_name, entries, params=None):
+        path = self._path(vcenter, validator_name, params)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as tmp_file:
+                pickle.dump(entries, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file.name, path)
+        except OSError as e:
+            logger.warning("Failed to persist validation cache %s: %s", path, e)
+
+    def invalidate(self, vcenter, validator_name, params=None):
+        try:
+            os.remove(self._path(vcenter, validator_name, params))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, vcenter, validator_name, params):
+        scope = f"{vcenter}:{validator_name}:{payload_fingerprint(params or {})}"
+        digest = hashlib.sha256(scope.encode()).hexdigest()
+        return os.path.join(self.root, f"validation-{digest}.pickle")
+
+
+def split_unchanged(fingerprints, previous):
+    """
+    Partition targets into (unchanged results by target, changed targets)
+    by comparing current fingerprints with the previous run.
+    """
+    unchanged = {}
+    changed = []
+    for target, fingerprint in fingerprints.items():
+        entry = previous.get(target)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            unchanged[target] = entry["results"]
+        else:
+            changed.append(target)
+    return unchanged, changed
@@ -0,0 +1,235 @@
+"""
+In-process timing for the PBV report pipeline.
+
+    @shared_task(name=TaskName.ESXI_MODULE, bind=True)
+    @timed_task
+    def esxi_module(self, data_results, data):
+        with timed("module.run") as timing:
+            ...
+        timing.elapsed, timing.start_time, timing.finish_time
+
+Durations are measured with a monotonic clock and aggregated per name into
+fixed-bucket histograms. They can be read with snapshot(), rendered in the
+Prometheus text format, written to a JSON dump file or served over HTTP.
+"""
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds, the last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    """Thread safe fixed-bucket histogram of durations in seconds"""
+
+    __slots__ = ("buckets", "counts", "count", "total", "min", "max", "errors", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "count": self.count,
+                "sum": self.total,
+                "min": self.min,
+                "max": self.max,
+                "errors": self.errors,
+                "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+            }
+        data["p50"] = self.quantile(0.5)
+        data["p99"] = self.quantile(0.99)
+        return data
+
+
+class MetricsRegistry:
+    """Named histograms for this process"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds, error=False):
+        self.histogram(name).observe(seconds, error)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histogram.to_dict() for name, histogram in sorted(histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+class Timing:
+    """Result of a timed() block"""
+
+    __slots__ = ("name", "start_time", "finish_time", "elapsed", "_started")
+
+    def __init__(self, name):
+        self.name = name
+        self.start_time = datetime.now(timezone.utc)
+        self.finish_time = None
+        self.elapsed = None
+        self._started = time.monotonic()
+
+    def stop(self):
+        self.elapsed = time.monotonic() - self._started
+        self.finish_time = datetime.now(timezone.utc)
+        return self.elapsed
+
+
+class timed:
+    """
+    Context manager timing a block into the registry under `name`.
+    Exceptions are counted as errors and re-raised.
+    """
+
+    __slots__ = ("name", "metrics", "timing")
+
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics or registry
+        self.timing = None
+
+    def __enter__(self):
+        self.timing = Timing(self.name)
+        return self.timing
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = self.timing.stop()
+        self.metrics.observe(self.name, elapsed, error=exc_type is not None)
+        return False
+
+
+def timed_task(fn):
+    """Record every call of a task function as `task.<function name>`"""
+    name = f"task.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def render_prometheus(metrics=None):
+    """Snapshot in the Prometheus text exposition format"""
+    lines = [
+        "# HELP pbv_duration_seconds PBV task and stage durations",
+        "# TYPE pbv_duration_seconds histogram",
+    ]
+    for name, data in (metrics or registry).snapshot().items():
+        cumulative = 0
+        for bound, count in data["buckets"].items():
+            cumulative += count
+            lines.append(f'pbv_duration_seconds_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'pbv_duration_seconds_sum{{name="{name}"}} {data["sum"]}')
+        lines.append(f'pbv_duration_seconds_count{{name="{name}"}} {data["count"]}')
+        lines.append(f'pbv_errors_total{{name="{name}"}} {data["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(path, metrics=None):
+    """Write a JSON snapshot atomically, `{pid}` in path is replaced"""
+    path = path.format(pid=os.getpid())
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as tmp_file:
+        json.dump((metrics or registry).snapshot(), tmp_file, indent=2, default=str)
+    os.replace(tmp_file.name, path)
+    return path
+
+
+def serve_metrics(port, host="127.0.0.1", metrics=None, max_tries=1):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json from a daemon thread.
+    Listens on localhost unless `host` says otherwise. With max_tries > 1
+    the next ports are tried when one is taken.
+    """
+    metrics = metrics or registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = render_prometheus(metrics), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot(), default=str), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    for offset in range(max_tries):
+        try:
+            server = ThreadingHTTPServer((host, port + offset), MetricsHandler)
+            break
+        except OSError:
+            if offset == max_tries - 1:
+                raise
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, name="pbv-metrics", daemon=True)
+    thread.start()
+    logger.info("Serving PBV metrics on %s:%d", host, port)
+    return server
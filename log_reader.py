@@ -0,0 +1,225 @@
+import os
+import threading
+
+DEFAULT_LINES = 200
+MAX_LINES = 5000
+INDEX_STEP = 1000
+# upper bound of bytes scanned when filtering a window with grep
+MAX_GREP_SCAN = 64 * 1024 * 1024
+READ_BLOCK = 64 * 1024
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class LineIndex:
+    """
+    Sparse line-offset index of a growing log file.
+
+    Records the byte offset of every `step`-th line start, so line N is
+    found by jumping to the nearest checkpoint and scanning at most `step`
+    lines. refresh() only scans what was appended since the last call and
+    starts over when the file was replaced or truncated.
+    """
+
+    def __init__(self, step=INDEX_STEP):
+        self.step = step
+        self.checkpoints = [0]
+        self.lines = 0
+        self.scanned = 0
+        self.inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self, data, inode):
+        with self._lock:
+            if inode != self.inode or len(data) < self.scanned:
+                self.checkpoints, self.lines, self.scanned, self.inode = [0], 0, 0, inode
+            position = self.scanned
+            while True:
+                newline = data.find(b"\n", position)
+                if newline < 0:
+                    break
+                position = newline + 1
+                self.lines += 1
+                if self.lines % self.step == 0:
+                    self.checkpoints.append(position)
+            self.scanned = position
+
+    def line_offset(self, data, line):
+        """Byte offset where `line` (0 based) starts, None past the end"""
+        with self._lock:
+            if line > self.lines:
+                return None
+            checkpoint = min(line // self.step, len(self.checkpoints) - 1)
+            position = self.checkpoints[checkpoint]
+        for _ in range(line - checkpoint * self.step):
+            position = data.find(b"\n", position) + 1
+        return position
+
+
+class FileView:
+    """
+    Read-only bytes-like view of the first `size` bytes of an open file.
+
+    Supports len(), slicing, and find/rfind of a single byte, read block
+    by block with os.pread. Unlike an mmap, a file truncated while it is
+    being read gives short reads here instead of killing the process with
+    SIGBUS: searches stop at the new end and slices come back shorter.
+    """
+
+    def __init__(self, fd, size, block=READ_BLOCK):
+        self.fd = fd
+        self.size = size
+        self.block = block
+        self._cached = (None, b"")
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.size)
+        if stop <= start:
+            return b""
+        block_start, data = self._read_block(start)
+        if stop <= block_start + len(data):
+            return data[start - block_start:stop - block_start]
+        return os.pread(self.fd, stop - start, start)
+
+    def find(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        position = start
+        while position < end:
+            block_start, data = self._read_block(position)
+            found = data.find(sub, position - block_start, end - block_start)
+            if found >= 0:
+                return block_start + found
+            if block_start + len(data) <= position:
+                # truncated since the size was taken
+                return -1
+            position = block_start + len(data)
+        return -1
+
+    def rfind(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        position = end
+        while position > start:
+            block_start, data = self._read_block(position - 1)
+            found = data.rfind(sub, max(start - block_start, 0), position - block_start)
+            if found >= 0:
+                return block_start + found
+            position = block_start
+        return -1
+
+    def _read_block(self, position):
+        block_start = position - position % self.block
+        if self._cached[0] != block_start:
+            length = min(self.block, self.size - block_start)
+            self._cached = (block_start, os.pread(self.fd, length, block_start))
+        return self._cached
+
+
+def get_index(path):
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LineIndex()
+        return index
+
+
+def read_window(path, lines=DEFAULT_LINES, before=None, offset=None, line=None, grep=None):
+    """
+    A window of complete lines from a log file without reading it whole.
+
+    Exactly one anchor applies, in this order:
+        line=N      `lines` lines starting at line N (uses the sparse index)
+        offset=X    `lines` lines starting at byte offset X
+        before=X    the `lines` lines ending at byte offset X
+        (none)      the last `lines` lines of the file
+
+    grep keeps only lines containing the text literally, it is not a regular
+    expression so a request cannot make the scan backtrack. The scan goes on
+    until `lines` matches are found or MAX_GREP_SCAN bytes were read. Returns
+    a dict with the lines and the byte range they cover, so clients can page
+    with before=start_offset. A negative anchor raises ValueError.
+    """
+    lines = max(1, min(int(lines), MAX_LINES))
+    line, offset, before = (non_negative(name, value) for name, value in (
+        ("line", line), ("offset", offset), ("before", before)
+    ))
+    pattern = grep or None
+    try:
+        logfile = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with logfile:
+        stat = os.fstat(logfile.fileno())
+        if not stat.st_size:
+            return window([], 0, 0, 0)
+        size = stat.st_size
+        data = FileView(logfile.fileno(), size)
+        if line is not None:
+            index = get_index(path)
+            index.refresh(data, stat.st_ino)
+            start = index.line_offset(data, line)
+            if start is None:
+                return window([], size, size, size)
+            return forward(data, start, lines, pattern)
+        if offset is not None:
+            start = min(offset, size)
+            if start and data[start - 1:start] != b"\n":
+                start = data.find(b"\n", start) + 1 or size
+            return forward(data, start, lines, pattern)
+        end = size if before is None else min(before, size)
+        return backward(data, end, lines, pattern)
+
+
+def non_negative(name, value):
+    if value is None:
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+
+def forward(data, start, lines, pattern):
+    found = []
+    position = start
+    limit = start + MAX_GREP_SCAN if pattern else len(data)
+    while position < min(len(data), limit) and len(found) < lines:
+        newline = data.find(b"\n", position)
+        if newline < 0:
+            break
+        text = data[position:newline].decode("utf-8", errors="replace")
+        position = newline + 1
+        if pattern is None or pattern in text:
+            found.append(text)
+    return window(found, start, position, len(data))
+
+
+def backward(data, end, lines, pattern):
+    found = []
+    # a trailing partial line is still being written, leave it out
+    if end == len(data) and data[end - 1:end] != b"\n":
+        end = data.rfind(b"\n", 0, end) + 1
+    position = end
+    limit = max(0, end - MAX_GREP_SCAN) if pattern else 0
+    while position > limit and len(found) < lines:
+        start = data.rfind(b"\n", 0, position - 1) + 1
+        text = data[start:position - 1].decode("utf-8", errors="replace")
+        position = start
+        if pattern is None or pattern in text:
+            found.append(text)
+    found.reverse()
+    return window(found, position, end, len(data))
+
+
+def window(found, start, end, size):
+    return {
+        "lines": found,
+        "start_offset": start,
+        "end_offset": end,
+        "size": size,
+        "has_more_before": start > 0,
+    }
@@ -0,0 +1,186 @@
+import os
+import queue
+import threading
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # optional, falls back to polling
+    INotify = None
+
+DEFAULT_QUEUE_SIZE = 1000
+POLL_INTERVAL = 0.25
+
+_tailers = {}
+_tailers_lock = threading.Lock()
+
+
+def get_tailer(path):
+    """The shared LogTailer for a file, one per path per process"""
+    path = os.path.abspath(path)
+    with _tailers_lock:
+        tailer = _tailers.get(path)
+        if tailer is None:
+            tailer = _tailers[path] = LogTailer(path)
+        return tailer
+
+
+class LogTailer:
+    """
+    Follows one log file with a single reader thread and broadcasts each
+    new line, with the byte offset just past it, to every subscriber.
+
+    The reader wakes up on inotify events for the file's directory when
+    inotify_simple is installed and polls every POLL_INTERVAL seconds
+    otherwise. A replaced (rotated) or truncated file is reopened from the
+    start. Each subscriber gets a bounded queue, a client that falls
+    behind loses its oldest lines instead of stalling the others. The
+    thread stops when the last subscriber leaves.
+    """
+
+    def __init__(self, path, queue_size=DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.queue_size = queue_size
+        self.offset = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        """(queue of (offset, line), offset the queue starts after)"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.offset is None:
+                self.offset = file_size(self.path)
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-tail", daemon=True)
+                self._thread.start()
+            return subscriber, self.offset
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _broadcast(self, offset, line):
+        with self._lock:
+            self.offset = offset
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait((offset, line))
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _run(self):
+        watcher = self._watch()
+        logfile = None
+        partial = b""
+        with self._lock:
+            position = self.offset
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        # the next subscriber starts from the file's size then
+                        self._thread = None
+                        self.offset = None
+                        return
+
+                if logfile is None or self._rotated(logfile):
+                    if logfile is not None:
+                        logfile.close()
+                        self._restart()
+                        position, partial = 0, b""
+                    logfile = open_at(self.path, position)
+                    if logfile is not None and position > os.fstat(logfile.fileno()).st_size:
+                        logfile.seek(0)
+                        self._restart()
+                        position, partial = 0, b""
+
+                if logfile is not None:
+                    for line in iter(logfile.readline, b""):
+                        if not line.endswith(b"\n"):
+                            partial += line
+                            break
+                        line, partial = partial + line, b""
+                        position += len(line)
+                        self._broadcast(position, line.decode("utf-8", errors="replace").rstrip("\n"))
+                    if partial:
+                        logfile.seek(position + len(partial))
+                self._wait(watcher)
+        finally:
+            if logfile is not None:
+                logfile.close()
+            if watcher is not None:
+                watcher.close()
+
+    def _restart(self):
+        """Offsets of a new or truncated file count from its start again"""
+        with self._lock:
+            self.offset = 0
+
+    def _rotated(self, logfile):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(logfile.fileno())
+        return current.st_ino != opened.st_ino or current.st_size < logfile.tell()
+
+    def _watch(self):
+        if INotify is None:
+            return None
+        try:
+            watcher = INotify()
+            watcher.add_watch(
+                os.path.dirname(self.path) or ".",
+                flags.MODIFY | flags.CREATE | flags.MOVED_TO | flags.DELETE,
+            )
+            return watcher
+        except OSError:
+            return None
+
+    def _wait(self, watcher):
+        if watcher is None:
+            threading.Event().wait(POLL_INTERVAL)
+            return
+        name = os.path.basename(self.path)
+        for event in watcher.read(timeout=1000):
+            if event.name == name:
+                return
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def open_at(path, offset):
+    try:
+        logfile = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    logfile.seek(offset)
+    return logfile
+
+
+def read_lines(path, start, end):
+    """(offset, line) pairs for complete lines between two byte offsets"""
+    logfile = open_at(path, start)
+    if logfile is None:
+        return
+    with logfile:
+        position = start
+        while position < end:
+            line = logfile.readline()
+            if not line.endswith(b"\n"):
+                return
+            position += len(line)
+            yield position, line.decode("utf-8", errors="replace").rstrip("\n")
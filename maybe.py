@@ -1,5 +1,12 @@
+import inspect
+import operator
 from abc import ABC
 
+try:
+    import numpy as np
+except ImportError:  # optional, only MaybeArray needs it
+    np = None
+
 class Maybe(ABC):
     """
     Monadic type named Maybe.
@@ -98,22 +105,244 @@ class Maybe(ABC):
     pass
 
 class Some(Maybe):
+    __slots__ = []
+
     def __init__(self, x):
         super().__init__(x)
         self.has_value = True
         return
 
+    def __reduce__(self):
+        return (Some, (self.value,))
+
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.value)
     
     pass
 
 class Nothing(Maybe):
+    __slots__ = []
+
     def __init__(self): 
         super().__init__(None)
         return
 
+    def __reduce__(self):
+        return (Nothing, ())
+
     def __repr__(self):
         return "{}()".format(self.__class__.__name__)
     
     pass
+
+
+class AsyncMaybe:
+    """
+    Awaitable Maybe for coroutine pipelines.
+    Bound steps may be regular or `async def` functions returning Maybe,
+    Nothing short-circuits the rest of the chain:
+
+        value = await (AsyncMaybe(lookup(host)) >> async_fetch_speed)
+
+    Wraps a single coroutine and can only be awaited once.
+    """
+
+    __slots__ = ["awaitable"]
+
+    def __init__(self, awaitable):
+        self.awaitable = awaitable
+
+    def __await__(self):
+        return self._resolve().__await__()
+
+    async def _resolve(self):
+        retv = self.awaitable
+        if inspect.isawaitable(retv):
+            retv = await retv
+        if not isinstance(retv, Maybe):
+            raise Exception("Invalid usage of AsyncMaybe")
+        return retv
+
+    def __rshift__(self, fn):
+        """ Monadic bind: async_maybe >> fn """
+        if not callable(fn):
+            raise Exception("Invalid usage of __rshift__()")
+        return AsyncMaybe(self._bind(fn))
+
+    def chain(self, fn):
+        """ Same as >> """
+        return self >> fn
+
+    async def _bind(self, fn):
+        retv = await self
+        if retv.is_nothing():
+            return retv
+        retv = fn(retv.value)
+        if inspect.isawaitable(retv):
+            retv = await retv
+        if not isinstance(retv, Maybe):
+            raise Exception("Invalid Usage of Monadic Bind")
+        return retv
+
+
+def _scalar(value):
+    """ numpy scalar to the matching Python value, object slots are returned as is """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class MaybeArray:
+    """
+    Vectorized Maybe over many values.
+    Definition: values buffer + boolean validity mask
+
+    Description:
+    mask[i] True is Some(values[i]), False is Nothing(). Used for bulk
+    optional data such as a per-host metric that is missing on some hosts,
+    without creating one Maybe object per value. Operations run over the
+    whole numpy buffer and keep the mask, reductions only see valid slots
+    and return a Maybe.
+    """
+
+    __slots__ = ["values", "mask"]
+
+    def __init__(self, values, mask=None):
+        if np is None:
+            raise ImportError("MaybeArray requires numpy")
+        values = np.asarray(values)
+        if mask is None:
+            mask = np.ones(values.shape, dtype=bool)
+        else:
+            mask = np.asarray(mask, dtype=bool)
+        if mask.shape != values.shape:
+            raise ValueError("MaybeArray values and mask must have the same shape")
+        self.values = values
+        self.mask = mask
+
+    @classmethod
+    def from_optional(cls, items, fill=0, dtype=None):
+        """ Build from a sequence where None marks a missing value """
+        items = list(items)
+        mask = np.fromiter((x is not None for x in items), dtype=bool, count=len(items))
+        values = np.array([fill if x is None else x for x in items], dtype=dtype)
+        return cls(values, mask)
+
+    @classmethod
+    def from_maybes(cls, maybes, fill=0, dtype=None):
+        """ Pack Some/Nothing objects into one array """
+        return cls.from_optional(
+            (m.value if m.has_value else None for m in maybes), fill, dtype
+        )
+
+    def to_maybes(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        for value, valid in zip(self.values.tolist(), self.mask.tolist()):
+            yield Some(value) if valid else Nothing()
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return Some(_scalar(self.values[key])) if self.mask[key] else Nothing()
+        return MaybeArray(self.values[key], self.mask[key])
+
+    def is_some(self):
+        return self.mask.copy()
+
+    def is_nothing(self):
+        return ~self.mask
+
+    def count(self):
+        """ Number of Some slots """
+        return int(self.mask.sum())
+
+    def map(self, fn):
+        """ fn: array -> array, applied to the whole buffer at once """
+        with np.errstate(all="ignore"):
+            values = fn(self.values)
+        return MaybeArray(values, self.mask)
+
+    def __rshift__(self, fn):
+        """ Monadic bind: fn: array -> MaybeArray, masks are combined """
+        if not callable(fn):
+            raise Exception("Invalid usage of __rshift__()")
+        with np.errstate(all="ignore"):
+            retv = fn(self.values)
+        if not isinstance(retv, MaybeArray):
+            raise Exception("Invalid Usage of Monadic Bind")
+        return MaybeArray(retv.values, self.mask & retv.mask)
+
+    def chain(self, fn):
+        """ Same as >> """
+        return self >> fn
+
+    def default(self, default_value):
+        """ Plain ndarray with Nothing slots replaced by default_value """
+        return np.where(self.mask, self.values, default_value)
+
+    def valid(self):
+        """ ndarray of the Some values only """
+        return self.values[self.mask]
+
+    def _compare(self, o, op):
+        if isinstance(o, MaybeArray):
+            return MaybeArray(op(self.values, o.values), self.mask & o.mask)
+        if isinstance(o, Maybe):
+            if o.is_nothing():
+                return MaybeArray(np.zeros(self.values.shape, dtype=bool), np.zeros(self.mask.shape, dtype=bool))
+            o = o.value
+        return MaybeArray(op(self.values, o), self.mask)
+
+    def __eq__(self, o):
+        return self._compare(o, operator.eq)
+
+    def __ne__(self, o):
+        return self._compare(o, operator.ne)
+
+    def __gt__(self, o):
+        return self._compare(o, operator.gt)
+
+    def __ge__(self, o):
+        return self._compare(o, operator.ge)
+
+    def __lt__(self, o):
+        return self._compare(o, operator.lt)
+
+    def __le__(self, o):
+        return self._compare(o, operator.le)
+
+    __hash__ = None
+
+    def _reduce(self, fn):
+        valid = self.valid()
+        if not valid.size:
+            return Nothing()
+        return Some(_scalar(fn(valid)))
+
+    def sum(self):
+        """ Nothing when there is no Some slot, like the other reductions """
+        return self._reduce(np.sum)
+
+    def mean(self):
+        return self._reduce(np.mean)
+
+    def min(self):
+        return self._reduce(np.min)
+
+    def max(self):
+        return self._reduce(np.max)
+
+    def all(self):
+        """ True when every Some slot is truthy """
+        return bool(self.valid().all())
+
+    def any(self):
+        return bool(self.valid().any())
+
+    def __repr__(self):
+        return "{}({})".format(
+            self.__class__.__name__,
+            [v if ok else None for v, ok in zip(self.values.tolist(), self.mask.tolist())],
+        )
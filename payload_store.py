@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import re
+import tempfile
+import time
+
+from cca_pbv.workers.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+REF_KEY = "__payload_ref__"
+DEFAULT_MIN_SIZE = 64 * 1024
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+# decoded payloads by digest, shared by the tasks of a chain on this worker
+_decoded = LRUCache(max_entries=8)
+
+# this worker's store directory, references never name their own location
+_store_root = None
+
+
+def set_store_root(root):
+    global _store_root
+    _store_root = root or None
+
+
+def is_payload_ref(value):
+    return isinstance(value, dict) and REF_KEY in value
+
+
+def resolve_payload(value):
+    """
+    Return the payload behind a reference, any other value unchanged.
+    References are read from the store root configured on this worker.
+    """
+    if not is_payload_ref(value):
+        return value
+    if _store_root is None:
+        raise ValueError("Received a payload reference but no payload store is configured")
+    return PayloadStore(_store_root).get(value)
+
+
+class PayloadStore:
+    """
+    Content addressed claim-check store for large task payloads.
+
+    put() writes a payload to local disk once per distinct content and
+    returns a small reference that travels through the broker instead:
+
+        {"__payload_ref__": "<sha256>", "size": 123}
+
+    Payloads below `min_size` bytes are returned inline. Blobs are read back
+    through mmap and registered against the order that produced them, so
+    release(order_id) can drop them once the report is finished. All tasks
+    of a chain must share the store directory (same host or shared volume),
+    a reference is resolved against the reader's own root only.
+
+    Blobs put without an order_id are only deleted by collect(), which
+    skips any blob put again within its max_age. Orders that were never
+    released, e.g. failed reports, stop holding their blobs after max_age.
+
+    Layout:
+        <root>/blobs/<digest>
+        <root>/orders/<order_id>/<digest>    empty marker, one per reference
+    """
+
+    __slots__ = ("root", "min_size")
+
+    def __init__(self, root, min_size=DEFAULT_MIN_SIZE):
+        self.root = root
+        self.min_size = min_size
+
+    def put(self, payload, order_id=None):
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) < self.min_size:
+            return payload
+        digest = hashlib.sha256(data).hexdigest()
+        if order_id:
+            # mark first, a concurrent release() must not see the blob unreferenced
+            order_dir = self._order_dir(order_id)
+            os.makedirs(order_dir, exist_ok=True)
+            open(os.path.join(order_dir, digest), "a").close()
+        path = self._blob_path(digest)
+        try:
+            # blobs without an order (the baseline) are kept alive by use,
+            # collect() only removes them once nobody put them for max_age
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_file.name, path)
+        _decoded.put(digest, payload)
+        return {REF_KEY: digest, "size": len(data)}
+
+    def get(self, ref):
+        digest = ref[REF_KEY]
+        if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Invalid payload reference {digest!r}")
+        payload = _decoded.get(digest)
+        if payload is not None:
+            return payload
+        with open(self._blob_path(digest), "rb") as blob:
+            with mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                payload = pickle.loads(data)
+        _decoded.put(digest, payload)
+        return payload
+
+    def release(self, order_id):
+        """Forget an order's references and delete blobs nobody else holds"""
+        order_dir = self._order_dir(order_id)
+        if not os.path.isdir(order_dir):
+            return 0
+        digests = os.listdir(order_dir)
+        for digest in digests:
+            os.remove(os.path.join(order_dir, digest))
+        os.rmdir(order_dir)
+        return sum(self._delete_if_unreferenced(digest) for digest in digests)
+
+    def collect(self, max_age):
+        """
+        Drop order references older than max_age seconds, then delete the
+        unreferenced blobs older than max_age
+        """
+        cutoff = time.time() - max_age
+        self._expire_orders(cutoff)
+        blob_dir = os.path.join(self.root, "blobs")
+        if not os.path.isdir(blob_dir):
+            return 0
+        removed = 0
+        for digest in os.listdir(blob_dir):
+            try:
+                if os.path.getmtime(os.path.join(blob_dir, digest)) < cutoff:
+                    removed += self._delete_if_unreferenced(digest)
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _expire_orders(self, cutoff):
+        orders_dir = os.path.join(self.root, "orders")
+        if not os.path.isdir(orders_dir):
+            return
+        for order_key in os.listdir(orders_dir):
+            order_dir = os.path.join(orders_dir, order_key)
+            try:
+                if os.path.getmtime(order_dir) >= cutoff:
+                    continue
+                for digest in os.listdir(order_dir):
+                    os.remove(os.path.join(order_dir, digest))
+                os.rmdir(order_dir)
+            except OSError:
+                # gone already or put to again meanwhile
+                continue
+
+    def _delete_if_unreferenced(self, digest):
+        orders_dir = os.path.join(self.root, "orders")
+        if os.path.isdir(orders_dir):
+            for order_id in os.listdir(orders_dir):
+                if os.path.exists(os.path.join(orders_dir, order_id, digest)):
+                    return 0
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            return 0
+        _decoded.invalidate(digest)
+        return 1
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, "blobs", digest)
+
+    def _order_dir(self, order_id):
+        return os.path.join(self.root, "orders", hashlib.sha256(str(order_id).encode()).hexdigest())
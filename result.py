@@ -1,5 +1,17 @@
+import asyncio
+import inspect
 import logging
+import queue
+import sys
+import threading
+import time
+from array import array
+from collections import deque
 from abc import ABC
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import Iterable
 
 from dependency_injector.wiring import inject, Provide
 from src.cca_pbv.library.container import Application
@@ -8,6 +20,25 @@ from src.cca_pbv.library.db.repository.result_repository_sync import ResultRepos
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_WORKERS = 16
+
+# how often gather looks for queued calls that started, to arm their timeout
+_START_POLL = 0.1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process wide thread pool shared by Result.gather and Result.traverse"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="result"
+            )
+    return _executor
+
 
 class Result(ABC):
     """
@@ -58,14 +89,17 @@ class Result(ABC):
 
     def expects(self, msg):
         if not self:
-            msg = f"{msg}: {self.err_val}"
-            logger.exception(msg)
-            raise Exception(msg)
+            self.log()
+            raise Exception(f"{msg}: {self.err_val}")
         return self.ok_val
 
     def default(self, default_value):
         return self.ok_val if self else default_value
 
+    def chain(self, fn):
+        """ Same as >> """
+        return self >> fn
+
     def pair_with(self, o):
         self.raise_if_err("Cannot pair due to:")
         o.raise_if_err("Cannot pair due to:")
@@ -78,31 +112,356 @@ class Result(ABC):
         is self.is_err():
             raise Exception(f"{msg} {self.err_val}")
 
+    @staticmethod
+    def gather(fns, max_workers=None, collect_errors=False, timeout=None, executor=None, settle=False):
+        """
+        Run independent Result returning callables concurrently on the
+        shared executor, or on `executor` when given, at most `max_workers`
+        in flight at a time. The shared executor has DEFAULT_MAX_WORKERS
+        threads, a larger max_workers without an executor gets a pool of
+        its own for the duration of the call.
+
+        Returns Ok([values...]) in input order. By default the first Err
+        wins and callables not yet started are cancelled; with
+        collect_errors=True every callable runs and the Err holds the list
+        of all error values. With settle=True every callable runs and the
+        result is Ok([Ok | Err...]), one Result per callable in input order,
+        so callers keep the successes next to the failures.
+
+        A callable still running `timeout` seconds after it started counts
+        as an Err. Its thread cannot be interrupted and keeps its pool slot
+        until the call returns, only the result is dropped.
+
+        The callables must not gather on the shared executor themselves,
+        nested fan-outs can starve the pool.
+        """
+        limit = max_workers or DEFAULT_MAX_WORKERS
+        if executor is not None or limit <= DEFAULT_MAX_WORKERS:
+            return _gather(fns, limit, collect_errors, timeout, executor or get_executor(), settle)
+        # the shared pool would cap the fan-out at DEFAULT_MAX_WORKERS
+        executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="result-gather")
+        try:
+            return _gather(fns, limit, collect_errors, timeout, executor, settle)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def traverse(fn, items, max_workers=None, collect_errors=False, timeout=None, executor=None, settle=False):
+        """Result.gather over fn(item) for every item"""
+        return Result.gather(
+            (partial(fn, item) for item in items),
+            max_workers=max_workers,
+            collect_errors=collect_errors,
+            timeout=timeout,
+            executor=executor,
+            settle=settle,
+        )
+
 class Ok(Result):
+    __slots__ = ()
     __match_args__ = ("ok_val",)
 
     def __init__(self, x):
-        super().__init__()
         self.ok_val = x
         self.err_val = None
 
+    def __reduce__(self):
+        return (Ok, (self.ok_val,))
+
+    def __rshift__(self, fn):
+        try:
+            retv = fn(self.ok_val)
+        except TypeError:
+            if not callable(fn):
+                raise SyntaxError("Incorrect usage of Result bind")
+            raise
+        # exact type check first, ABC isinstance only for user subclasses
+        if retv.__class__ not in _RESULT_TYPES and not isinstance(retv, Result):
+            raise Exception("Invalid usage of monadic bind on Result")
+        return retv
+
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.ok_val)
 
 
 class Err(Result):
+    """
+    Error branch of Result. Construction is cheap and silent by default,
+    call log() where the failure is actually handled, or set
+    Err.log_on_create = True to restore logging on every construction.
+    """
+
+    __slots__ = ()
     __match_args__ = ("err_val",)
 
+    log_on_create = False
+
     def __init__(self, x):
-        super().__init__()
-        self.err_val = x    
-        logger.error(x)
+        self.err_val = x
         self.ok_val = None
+        if Err.log_on_create:
+            logger.error(x)
+
+    def __reduce__(self):
+        return (Err, (self.err_val,))
+
+    def __rshift__(self, fn):
+        return self
+
+    def log(self, level=logging.ERROR):
+        logger.log(level, self.err_val)
+        return self
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.err_val)
 
 
+_RESULT_TYPES = frozenset((Ok, Err))
+
+
+class BindTracer:
+    """
+    Records one span per Ok bind while tracing is enabled: the stack of
+    bound function names (nested binds included), duration, self time and
+    outcome ("ok", "err" or "raised"). Spans are kept in a ring buffer of
+    `capacity` entries.
+
+        tracer = enable_bind_tracing()
+        ...
+        disable_bind_tracing()
+        open("binds.folded", "w").write(tracer.folded())
+
+    folded() produces the collapsed stack format read by flamegraph.pl,
+    speedscope and similar tools, weighted by self time in microseconds.
+    """
+
+    __slots__ = ("spans", "_local")
+
+    def __init__(self, capacity=10000):
+        self.spans = deque(maxlen=capacity)
+        self._local = threading.local()
+
+    def bind(self, result, fn):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        frame = [_fn_name(fn), 0]
+        stack.append(frame)
+        outcome = "raised"
+        start = time.perf_counter_ns()
+        try:
+            retv = _untraced_bind(result, fn)
+            outcome = "err" if retv.is_err() else "ok"
+            return retv
+        finally:
+            duration = time.perf_counter_ns() - start
+            names = tuple(name for name, _ in stack)
+            stack.pop()
+            if stack:
+                stack[-1][1] += duration
+            self.spans.append((names, duration, duration - frame[1], outcome))
+
+    def records(self):
+        return [
+            {"stack": list(names), "duration_ns": duration, "self_ns": self_ns, "outcome": outcome}
+            for names, duration, self_ns, outcome in list(self.spans)
+        ]
+
+    def folded(self):
+        totals = {}
+        for names, _, self_ns, outcome in list(self.spans):
+            key = ";".join(names) if outcome == "ok" else f"{';'.join(names)} [{outcome}]"
+            totals[key] = totals.get(key, 0) + self_ns
+        return "".join(f"{key} {max(1, ns // 1000)}\n" for key, ns in totals.items())
+
+    def clear(self):
+        self.spans.clear()
+
+
+_untraced_bind = Ok.__rshift__
+_tracer = None
+
+
+def _fn_name(fn):
+    name = getattr(fn, "__qualname__", None) or getattr(fn, "__name__", None)
+    if name is None:
+        return repr(fn)
+    module = getattr(fn, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+
+def _traced_bind(self, fn):
+    # disable_bind_tracing may run between the lookup of Ok.__rshift__ and here
+    tracer = _tracer
+    if tracer is None:
+        return _untraced_bind(self, fn)
+    return tracer.bind(self, fn)
+
+
+def enable_bind_tracing(capacity=10000):
+    """
+    Start tracing Ok binds and return the tracer. While disabled Ok uses
+    its plain __rshift__, so tracing costs nothing unless switched on.
+    """
+    global _tracer
+    _tracer = BindTracer(capacity)
+    Ok.__rshift__ = _traced_bind
+    return _tracer
+
+
+def disable_bind_tracing():
+    """Stop tracing and return the tracer that was active, if any"""
+    global _tracer
+    Ok.__rshift__ = _untraced_bind
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def _gather(fns, limit, collect_errors, timeout, executor, settle=False):
+    """Result.gather on a given executor, see there"""
+    items = enumerate(fns)
+    pending = {}
+    started = {}
+    values = {}
+    errors = []
+    exhausted = False
+
+    while True:
+        while not exhausted and len(pending) < limit:
+            item = next(items, None)
+            if item is None:
+                exhausted = True
+                break
+            index, fn = item
+            future = executor.submit(_call_started, fn, index, started)
+            pending[future] = index
+        if not pending:
+            break
+        wait_for = None
+        if timeout is not None:
+            # calls still queued have no deadline yet, look again shortly
+            deadlines = [started[index] + timeout for index in pending.values() if index in started]
+            wait_for = min(deadlines + [time.monotonic() + min(timeout, _START_POLL)])
+            wait_for = max(0, wait_for - time.monotonic())
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            retv = future.result()
+            if settle:
+                values[index] = retv
+            elif retv.is_err():
+                errors.append((index, retv.err_val))
+            else:
+                values[index] = retv.ok_val
+        if timeout is not None:
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if index in started and started[index] + timeout <= now and not future.done():
+                    del pending[future]
+                    if settle:
+                        values[index] = Err(f"Timed out after {timeout}s")
+                    else:
+                        errors.append((index, f"Timed out after {timeout}s"))
+        if errors and not collect_errors:
+            for future in pending:
+                future.cancel()
+            return Err(errors[0][1])
+
+    if errors:
+        return Err([err for _, err in sorted(errors, key=lambda e: e[0])])
+    return Ok([values[i] for i in sorted(values)])
+
+
+def _call_started(fn, index, started):
+    started[index] = time.monotonic()
+    return _call_result(fn)
+
+
+def _call_result(fn):
+    try:
+        retv = fn()
+    except Exception as e:
+        logger.exception("Concurrent Result call failed")
+        return Err(str(e))
+    if not isinstance(retv, Result):
+        return Err("Invalid usage of Result.gather, callable must return a Result")
+    return retv
+
+
+class AwaitableResult:
+    """
+    Awaitable Result for coroutine pipelines.
+
+    Wraps an awaitable (or a plain Result) that resolves to Ok | Err.
+    Bound steps may be regular or `async def` functions returning Result,
+    nothing runs until the chain is awaited, and an Err short-circuits the
+    remaining steps exactly like Result.__rshift__:
+
+        result = await (AwaitableResult(fetch_host(h)) >> parse >> validate)
+
+    An AwaitableResult wraps a single coroutine and can only be awaited once.
+    """
+
+    __slots__ = ("_awaitable",)
+
+    def __init__(self, awaitable):
+        self._awaitable = awaitable
+
+    @classmethod
+    def from_sync(cls, fn, *args, **kwargs):
+        """Run a blocking Result returning call in the default thread pool"""
+        return cls(asyncio.to_thread(fn, *args, **kwargs))
+
+    def __await__(self):
+        return self._resolve().__await__()
+
+    async def _resolve(self):
+        retv = self._awaitable
+        if inspect.isawaitable(retv):
+            retv = await retv
+        if not isinstance(retv, Result):
+            raise Exception("Invalid usage of AwaitableResult, awaitable must resolve to a Result")
+        return retv
+
+    def __rshift__(self, fn):
+        if not callable(fn):
+            raise SyntaxError("Incorrect usage of AwaitableResult bind")
+        return AwaitableResult(self._bind(fn))
+
+    def chain(self, fn):
+        """ Same as >> """
+        return self >> fn
+
+    async def _bind(self, fn):
+        retv = await self
+        if retv.is_err():
+            return retv
+        retv = fn(retv.ok_val)
+        if inspect.isawaitable(retv):
+            retv = await retv
+        if not isinstance(retv, Result):
+            raise Exception("Invalid usage of monadic bind on AwaitableResult")
+        return retv
+
+    @staticmethod
+    def gather(*awaitables, collect_errors=False):
+        """
+        asyncio.gather for Results: Ok([values...]) in input order, the
+        first Err otherwise, or Err([errors...]) with collect_errors=True.
+        """
+        async def run():
+            results = await asyncio.gather(*(AwaitableResult(a) for a in awaitables))
+            errors = [r.err_val for r in results if r.is_err()]
+            if errors:
+                return Err(errors if collect_errors else errors[0])
+            return Ok([r.ok_val for r in results])
+        return AwaitableResult(run())
+
+
+# previous name, kept for existing imports
+AsyncResult = AwaitableResult
+
+
 def result_wrap(msg=""):
     """
     Decorator to provide a default Err route for a function
@@ -122,33 +481,145 @@ def result_wrap(msg=""):
         
     return fn_wrap
 
+DEFAULT_BATCH_SIZE = 500
+
+
+def batched(iterable, size):
+    """
+    Yield lists of at most `size` items from any iterable or generator
+    without materialising the whole input.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class ResultService:
     """
     Result Tracker manages the state of a report allowing for CRUD operations
     """
 
-    __slots__ = ("result_repository",)
+    __slots__ = ("result_repository", "batch_size")
 
     @inject
     def __init__(
         self, 
         result_repository: ResultRepository = Provide[Application.result_repository
         ],
+        batch_size: int = DEFAULT_BATCH_SIZE,
     ):
         """Initializer"""
         self.result_repository = result_repository
+        self.batch_size = batch_size
+
+    def save_results(self, results: Iterable[ResultEntity], batch_size: int = None):
+        """
+        Persist results in chunks of `batch_size` rows, one bulk_add per chunk.
+        Accepts a list or a generator. A failing chunk is logged and counted
+        rather than aborting the remaining ones.
+
+        Returns Ok({"written": n, "failed": m}) when every chunk was stored,
+        Err with the same counts otherwise.
+        """
+        counts = {"written": 0, "failed": 0}
+        for batch in batched(results, batch_size or self.batch_size):
+            self._write_batch(batch, counts)
+        if counts["failed"]:
+            return Err(counts)
+        return Ok(counts)
+
+    def flusher(self, batch_size: int = None, max_pending: int = 2):
+        """Background writer bound to this service, see ResultFlusher"""
+        return ResultFlusher(self, batch_size or self.batch_size, max_pending)
+
+    def _write_batch(self, batch, counts):
+        try:
+            self.result_repository.bulk_add(batch)
+        except Exception as e:
+            logger.exception("Failed to save batch of %d results: %s", len(batch), e)
+            counts["failed"] += len(batch)
+            return
+        counts["written"] += len(batch)
+
+
+class ResultFlusher:
+    """
+    Writes results on a background thread while the caller keeps producing them.
+
+    At most `max_pending` batches are queued; `submit` blocks once the queue
+    is full so memory stays bounded by max_pending * batch_size rows.
+
+    Usage:
+        with service.flusher(batch_size=1000) as flusher:
+            flusher.submit(record_generator)
+        flusher.result  # Ok({"written": n, "failed": m}) or Err(...)
+    """
+
+    __slots__ = ("service", "batch_size", "result", "_queue", "_thread", "_counts")
+
+    _STOP = object()
+
+    def __init__(self, service: ResultService, batch_size: int = DEFAULT_BATCH_SIZE, max_pending: int = 2):
+        self.service = service
+        self.batch_size = batch_size
+        self.result = None
+        self._counts = {"written": 0, "failed": 0}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="result-flusher", daemon=True)
+        self._thread.start()
+
+    def submit(self, results: Iterable[ResultEntity]):
+        for batch in batched(results, self.batch_size):
+            self._queue.put(batch)
+
+    def close(self):
+        """Flush everything submitted so far and return the write counts"""
+        if self.result is None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            failed = self._counts["failed"]
+            self.result = Err(self._counts) if failed else Ok(self._counts)
+        return self.result
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is self._STOP:
+                return
+            self.service._write_batch(batch, self._counts)
+
+    def __enter__(self):
+        return self
 
-    def save_results(self, results: list[ResultEntity]):
-        if results:
-            self.result_repository.bulk_add(results)
+    def __exit__(self, *exc):
+        self.close()
+        return False
 
 def format_results(results, order_id, category):
-    result_records = []
+    return list(iter_result_records(results, order_id, category))
+
+def iter_result_records(results, order_id, category):
+    """
+    Lazy counterpart of format_results: yields one ResultEntity per
+    (target, plugin_result) pair as it is produced, so the records can be
+    fed straight into ResultService.save_results or a ResultFlusher.
+    """
     for target, target_results in results.items():
         for result in target_results:
-            result_record = generate_result_record(category, target, order_id, result)
-            result_records.append(result_record)
-    return result_records
+            yield generate_result_record(category, target, order_id, result)
+
+def stream_results(result_service, results, order_id, category, batch_size=None):
+    """
+    Format and persist results in one pass. A background flusher writes
+    each batch while the next one is being formatted.
+    """
+    records = iter_result_records(results, order_id, category)
+    with result_service.flusher(batch_size=batch_size) as flusher:
+        flusher.submit(records)
+    return flusher.result
 
 def generate_result_record(category, target, order_id, plugin_result):
     return ResultEntity(
@@ -163,3 +634,109 @@ def generate_result_record(category, target, order_id, plugin_result):
         start_time=plugin_result.get("start_time"),
         finish_time=plugin_result.get("finish_time"),
     )
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class ResultBatch:
+    """
+    Column-oriented store for the plugin results of one report category.
+
+    category and order_id are shared by every row and kept once, targets,
+    plugin tags and descriptions are interned so repeated hosts and plugins
+    share a single string. Rows only become ResultEntity objects when the
+    batch is iterated, i.e. at the repository boundary:
+
+        batch = ResultBatch.from_results(results, order_id, category)
+        result_service.save_results(batch)
+    """
+
+    __slots__ = (
+        "category",
+        "order_id",
+        "targets",
+        "plugins",
+        "descriptions",
+        "fails",
+        "fail_values",
+        "fail_data",
+        "pass_data",
+        "start_times",
+        "finish_times",
+    )
+
+    # bool fail flags are stored as a signed byte, _FAIL_NONE marks a missing
+    # value and _FAIL_OTHER a non-bool one (a count, a message) that is kept
+    # unchanged in fail_values
+    _FAIL_NONE = -1
+    _FAIL_OTHER = 2
+
+    def __init__(self, category, order_id):
+        self.category = _intern(category)
+        self.order_id = _intern(order_id)
+        self.targets = []
+        self.plugins = []
+        self.descriptions = []
+        self.fails = array("b")
+        self.fail_values = {}
+        self.fail_data = []
+        self.pass_data = []
+        self.start_times = []
+        self.finish_times = []
+
+    @classmethod
+    def from_results(cls, results, order_id, category):
+        batch = cls(category, order_id)
+        for target, target_results in results.items():
+            target = _intern(target)
+            for result in target_results:
+                batch.append(target, result)
+        return batch
+
+    def append(self, target, plugin_result):
+        fail = plugin_result.get("fail")
+        self.targets.append(_intern(target))
+        self.plugins.append(_intern(plugin_result.get("tag")))
+        self.descriptions.append(_intern(plugin_result.get("description")))
+        if fail is None:
+            self.fails.append(self._FAIL_NONE)
+        elif type(fail) is bool:
+            self.fails.append(int(fail))
+        else:
+            self.fail_values[len(self.fails)] = fail
+            self.fails.append(self._FAIL_OTHER)
+        self.fail_data.append(plugin_result.get("fail_data"))
+        self.pass_data.append(plugin_result.get("pass_data"))
+        self.start_times.append(plugin_result.get("start_time"))
+        self.finish_times.append(plugin_result.get("finish_time"))
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        """Yield one ResultEntity per row"""
+        for i in range(len(self.targets)):
+            yield self.entity(i)
+
+    def entity(self, i):
+        fail = self.fails[i]
+        if fail == self._FAIL_NONE:
+            fail = None
+        elif fail == self._FAIL_OTHER:
+            fail = self.fail_values[i]
+        else:
+            fail = bool(fail)
+        return ResultEntity(
+            Category=self.category,
+            fail_data=self.fail_data[i],
+            pass_data=self.pass_data[i],
+            description=self.descriptions[i],
+            fail=fail,
+            order_id=self.order_id,
+            plugin=self.plugins[i],
+            target=self.targets[i],
+            start_time=self.start_times[i],
+            finish_time=self.finish_times[i],
+        )
@@ -0,0 +1,48 @@
+"""
+Micro-benchmark for the Result bind path.
+
+    python result_bench.py [steps] [repeat]
+
+Reports the cost per `>>` step for an Ok chain and for an Err that
+short-circuits the same chain.
+"""
+import sys
+import timeit
+
+from cca_pbv.library.results.result import Ok, Err
+
+
+def step(x):
+    return Ok(x)
+
+
+def build_chain(steps):
+    def run(start):
+        r = start
+        for _ in range(steps):
+            r = r >> step
+        return r
+    return run
+
+
+def bench(label, start, steps, repeat):
+    run = build_chain(steps)
+    number = max(1, 100_000 // steps)
+    best = min(timeit.repeat(lambda: run(start), number=number, repeat=repeat))
+    per_step = best / (number * steps) * 1e9
+    print(f"{label:<24} {per_step:8.1f} ns/step")
+    return per_step
+
+
+def main(argv):
+    steps = int(argv[1]) if len(argv) > 1 else 100
+    repeat = int(argv[2]) if len(argv) > 2 else 5
+    bench("Ok bind", Ok(1), steps, repeat)
+    bench("Err short-circuit", Err("expected failure"), steps, repeat)
+
+    number = 100_000
+    best = min(timeit.repeat(lambda: Err("expected failure"), number=number, repeat=repeat))
+    print(f"{'Err construction':<24} {best / number * 1e9:8.1f} ns")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from cca_pbv.library.models.report_models import ReportState
+from cca_pbv.library.results.result import Result, Ok, Err
+
+logger = logging.getLogger(__name__)
+
+# report states after which no further update is expected for an order
+TERMINAL_STATES = frozenset((ReportState.SUCCESS, ReportState.FAILED))
+
+_TERMINAL_VALUES = frozenset(str(state.value).lower() for state in TERMINAL_STATES)
+
+
+def _state_value(status):
+    return str(getattr(status, "value", status)).lower()
+
+
+def is_terminal(status):
+    """True for a terminal ReportState or its value, as sent by the task chain"""
+    return _state_value(status) in _TERMINAL_VALUES
+
+
+def is_success(status):
+    return _state_value(status) == _state_value(ReportState.SUCCESS)
+
+
+class ReportStatusBuffer:
+    """
+    Coalesces report state and metadata updates per order_id and writes them
+    through a single ReportService per flush, one write per order instead of
+    one per update.
+
+    Only the latest state of an order is kept, together with when it was
+    first and last updated and how many transitions were folded into it.
+    Pending updates are flushed every `flush_interval` seconds, as soon as
+    `max_pending` orders are buffered, and immediately when an order reaches
+    a terminal state so final states are never left behind in memory. Once
+    an order reached a terminal state later non-terminal updates for it are
+    dropped.
+
+    The worker also flushes when each task finishes (task_postrun), so under
+    the prefork pool nothing is held in a child once the task that made the
+    update is done and a sibling picks up the next task of the order.
+    `write_through` writes every update as soon as it is made.
+    """
+
+    # terminal order ids remembered to drop late non-terminal updates
+    _TERMINAL_MEMORY = 1024
+
+    def __init__(self, service_factory, flush_interval=2.0, max_pending=100, write_through=False):
+        self.service_factory = service_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.write_through = write_through
+        self._pending = {}
+        self._terminal = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def update_status(self, order_id, status, task_name):
+        """Buffer a state change, returns the flush Result for terminal states"""
+        terminal = is_terminal(status)
+        with self._lock:
+            if not terminal and order_id in self._terminal:
+                logger.warning("Dropping %s update for finished order %s", status, order_id)
+                return Ok(False)
+            if terminal:
+                self._terminal[order_id] = True
+                self._terminal.move_to_end(order_id)
+                while len(self._terminal) > self._TERMINAL_MEMORY:
+                    self._terminal.popitem(last=False)
+            entry = self._entry(order_id)
+            entry["status"] = status
+            entry["task_name"] = task_name
+            entry["transitions"] += 1
+            full = len(self._pending) >= self.max_pending
+        if terminal or self.write_through:
+            return self.flush(order_id)
+        if full:
+            return self.flush()
+        self._start_timer()
+        return Ok(False)
+
+    def update_metadata(self, order_id, metadata, task_name, flush=False):
+        """Buffer metadata, with `flush` it is written now and the write Result returned"""
+        with self._lock:
+            entry = self._entry(order_id)
+            entry["metadata"] = {**(entry["metadata"] or {}), **metadata}
+            entry["metadata_task_name"] = task_name
+            full = len(self._pending) >= self.max_pending
+        if flush or self.write_through:
+            return self.flush(order_id)
+        if full:
+            return self.flush()
+        self._start_timer()
+        return Ok(False)
+
+    def pending(self, order_id):
+        with self._lock:
+            entry = self._pending.get(order_id)
+            return dict(entry) if entry else None
+
+    def clear(self):
+        """Drop everything buffered without writing it"""
+        with self._lock:
+            self._pending.clear()
+            self._terminal.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self, order_id=None):
+        """
+        Write every buffered order, or only `order_id`. Entries that fail
+        are put back unless a newer update for the same order arrived in
+        the meantime.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not (self._pending if order_id is None else order_id in self._pending):
+                    return Ok(True)
+            try:
+                service = self.service_factory()
+            except Exception as e:
+                logger.exception("Failed to create the report service, keeping updates buffered")
+                return Err(f"Report status flush failed: {e}")
+
+            with self._lock:
+                if order_id is None:
+                    pending, self._pending = self._pending, {}
+                else:
+                    pending = {order_id: self._pending.pop(order_id)}
+            failed = []
+            for order_id, entry in pending.items():
+                error = self._write(service, order_id, entry)
+                if error:
+                    failed.append(f"{order_id}: {error}")
+                    with self._lock:
+                        self._pending.setdefault(order_id, entry)
+
+            logger.debug("Flushed %d report updates, %d failed", len(pending), len(failed))
+            if failed:
+                logger.error("Report status flush failed for %s", ", ".join(failed))
+                return Err(f"Report status flush failed for {', '.join(failed)}")
+            return Ok(True)
+
+    def _write(self, service, order_id, entry):
+        try:
+            if entry["metadata"]:
+                retv = service.update_report_metadata(
+                    order_id, entry["metadata"], entry["metadata_task_name"]
+                )
+                if isinstance(retv, Result) and retv.is_err():
+                    return retv.err_val
+                entry["metadata"] = None
+            if entry["status"] is not None:
+                retv = service.update_report_state(order_id, entry["status"], entry["task_name"])
+                if isinstance(retv, Result) and retv.is_err():
+                    return retv.err_val
+        except Exception as e:
+            logger.exception("Failed to write report update for %s", order_id)
+            return str(e)
+        return None
+
+    def _entry(self, order_id):
+        now = time.time()
+        entry = self._pending.get(order_id)
+        if entry is None:
+            entry = self._pending[order_id] = {
+                "status": None,
+                "task_name": None,
+                "metadata": None,
+                "metadata_task_name": None,
+                "transitions": 0,
+                "first_seen": now,
+            }
+        entry["updated_at"] = now
+        return entry
+
+    def _start_timer(self):
+        if not self.flush_interval:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+        with self._lock:
+            more = bool(self._pending)
+        if more:
+            self._start_timer()
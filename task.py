@@ -1,5 +1,13 @@
+import copy
+import hashlib
+import os
+import pickle
 import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import chord, group
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
 from celery.result import AsyncResult
 from celery.result import shared_task
 
@@ -11,6 +19,30 @@ from cca_pbv.library.report import ReportService, generate_report_data
 from cca_pbv.library.mail import ReportEmail
 from cca_pbv.library.modules import VmwareModule
 from cca_pbv.library.baseline import BaselineConfig
+from cca_pbv.library.results.result import Ok, Err, Result
+from cca_pbv.library.results.codec import register_enum, register_result_serializer
+from cca_pbv.workers.cache import LRUCache, SingleFlight
+from cca_pbv.workers.status_buffer import ReportStatusBuffer, is_success, is_terminal
+from cca_pbv.workers.instrumentation import (
+    dump_metrics,
+    serve_metrics,
+    timed,
+    timed_task,
+)
+from cca_pbv.workers.incremental import (
+    WHOLE_TARGET,
+    ValidationCache,
+    host_fingerprint,
+    payload_fingerprint,
+    split_unchanged,
+)
+from cca_pbv.workers.payload_store import (
+    REF_KEY,
+    PayloadStore,
+    is_payload_ref,
+    resolve_payload,
+    set_store_root,
+)
 from cca_pbv.workers.builder import (
     TaskName,
     get_builder,
@@ -24,8 +56,81 @@ from celery.utils.log import get_task_logger
 
 logger = get_task_logger(__name__)
 
+# lets tasks opt in to serializer="pbv" and pass Ok/Err/Some/Nothing as-is
+register_result_serializer()
+register_enum(TaskName)
+
+# validator per module name, tasks only carry the name across the broker.
+# Only validators that report per host may be sharded by host, cluster and
+# vCenter level checks need to see every host in one run.
+MODULE_VALIDATORS = {
+    "esxi": ESXiHostValidator,
+}
+
+EXTRA_VARS_CACHE_ENTRIES = 8
+EXTRA_VARS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# parsed ExtraVars keyed by content hash, shared by the tasks of a report chain
+extra_vars_cache = LRUCache(
+    max_entries=EXTRA_VARS_CACHE_ENTRIES, max_size=EXTRA_VARS_CACHE_MAX_BYTES
+)
+
+BASELINE_CACHE_TTL = 300
+
+# branch -> (config_tree, baseline_version), skips the pull while fresh
+baseline_branch_cache = LRUCache(max_entries=4, ttl=BASELINE_CACHE_TTL)
+# baseline_version -> (config_tree, baseline_version), skips the parse
+baseline_version_cache = LRUCache(max_entries=4)
+
+EXTRA_VARS_FRESH_FOR = 30
+
+# per-host timeout for intra-task host concurrency, in seconds
+MODULE_HOST_TIMEOUT = 600
+
+# concurrent reports for the same vCenter/branch share one data collection
+data_collection_flight = SingleFlight()
+
+# unreferenced baseline blobs are collected after this many seconds
+PAYLOAD_MAX_AGE = 24 * 60 * 60
+
+# report state/metadata writes, coalesced per order_id
+report_status_buffer = ReportStatusBuffer(lambda: ReportService())
+
+
+@task_prerun.connect
+def configure_payload_store(task=None, **kwargs):
+    # payload references are only resolved against this worker's own store
+    env = getattr(task, "env", None)
+    if env is not None:
+        set_store_root(env.get_else("payload_store_dir", ""))
+
+
+@task_postrun.connect
+def flush_report_status_after_task(**kwargs):
+    # the next task of the order may run in a sibling prefork child, write
+    # what this task buffered before the child takes other work
+    report_status_buffer.flush()
+
+
+@worker_init.connect
+def start_metrics_endpoint(**kwargs):
+    # once per worker, in the main process. Prefork children keep their own
+    # histograms, they are written to PBV_METRICS_FILE on shutdown
+    port = os.environ.get("PBV_METRICS_PORT")
+    if port:
+        serve_metrics(int(port), host=os.environ.get("PBV_METRICS_HOST", "127.0.0.1"))
+
+
+@worker_process_shutdown.connect
+def flush_report_status(**kwargs):
+    report_status_buffer.flush()
+    metrics_file = os.environ.get("PBV_METRICS_FILE")
+    if metrics_file:
+        dump_metrics(metrics_file)
+
 
 @shared_task(name=TaskName.EXECUTE_REPORT, bind=True)
+@timed_task
 def report(self, request):
     data = generate_report_data(request)
     report_type = request["report_type"]
@@ -48,6 +153,7 @@ def report(self, request):
 
 
 @shared_task(name=TaskName.CREATE_INITIAL_REPORT, bind=True)
+@timed_task
 def create_initial_report(self, data):
     report_service = ReportService()
     report = report_service.create_report(data=data)
@@ -55,21 +161,27 @@ def create_initial_report(self, data):
 
 
 @shared_task(name=TaskName.UPDATE_REPORT_STATUS, bind=True)
+@timed_task
 def update_report_status(self, task_id, data, status, *args, **kwargs):
     task_name = self.name
     if task_id:
         res = AsyncResult(task_id)
         
-    report_tracker = ReportService()
-    report_tracker.update_report_state(data["order_id"], status, task_name)
+    flushed = report_status_buffer.update_status(data["order_id"], status, task_name)
+    if is_terminal(status):
+        flushed.expects("Report status failed to update.")
+    # a failed task may still be retried and read its payloads, those of
+    # failed orders are expired by the age based collect()
+    if is_success(status):
+        release_payloads(self.env, data["order_id"])
 
 
 @shared_task(name=TaskName.SAVE_METADATA, bind=True)
+@timed_task
 def save_metadata(self, data_results, data):
     extra_vars_dump, baseline_config = extract_results_from_data_collection(data_results)
     baseline_config, baseline_version = baseline
-    extra_vars = ExtraVars()
-    extra_vars.load(json_string=str(extra_vars_dump))
+    extra_vars = load_extra_vars(extra_vars_dump)
     
     metadata = {
         "vcenter_version": extra_vars.get_vcsa_version(),
@@ -77,41 +189,146 @@ def save_metadata(self, data_results, data):
         "baseline_version": baseline_version,
     }
 
-    report_service = ReportService()
-    report_service.update_report_metadata(
-        data["order_id"], metadata, self.name.value
+    report_status_buffer.update_metadata(
+        data["order_id"], metadata, self.name.value, flush=True
     ).expects("Report metadata failed to update.")
 
     return extra_vars_dump, baseline_config, metadata
 
 
 @shared_task(name=TaskName.RETRIEVE_EXTRA_VARS, bind=True)
+@timed_task
 def retrieve_extra_vars(self, data):
+    host = data["request"]["host"]
+    job_id = data["request"].get("job_id")
+    fresh_for = float(self.env.get_else("extra_vars_fresh_for", EXTRA_VARS_FRESH_FOR))
+    extra_vars_dump = data_collection_flight.do(
+        ("extra_vars", host, job_id), load_mongo_extra_vars, host, job_id,
+        fresh_for=fresh_for, shared_dir=self.env.get_else("single_flight_dir", ""),
+    )
+    return offload_payload(self.env, extra_vars_dump, data.get("order_id"))
+
+def load_mongo_extra_vars(host, job_id):
     extra_vars = ExtraVars()
     mongo_params = ExtraVarsMongoSearchCriteria(
-        vcenter=data["request"]["host"],
-        job_id=data["request"].get("job_id")
+        vcenter=host,
+        job_id=job_id
     )
-    extra_vars.load(mongo=mongo_params)
+    with timed("extra_vars.mongo"):
+        extra_vars.load(mongo=mongo_params)
     return extra_vars.dump()
 
 
 @shared_task(name=TaskName.RETRIEVE_VSPHERE_CONFIG, bind=True)
+@timed_task
 def retrieve_vsphere_config(self):
-    baseline = BaselineConfig(self.env)
-    baseline.pull().expects("Baseline error")
+    branch = self.env.get_else("bitbucket_branch", "")
+    cached = baseline_branch_cache.get(branch)
+    if cached is None:
+        cached = data_collection_flight.do(
+            ("baseline", branch), pull_vsphere_config, self.env, branch,
+            shared_dir=self.env.get_else("single_flight_dir", ""),
+        )
+        # the value may come from another worker process's pull
+        baseline_branch_cache.put(branch, cached)
+    config_tree, baseline_version = cached
+    return offload_payload(self.env, config_tree), baseline_version
+
+def pull_vsphere_config(env, branch):
+    baseline = BaselineConfig(env)
+    with timed("baseline.pull"):
+        pulled = baseline.pull()
+    pulled.expects("Baseline error")
     encoded_version = baseline.get_baseline_version()
     baseline_version = (
         encoded_version.decode()
         if encoded_version
-        else self.env.get_else("bitbucket_branch", "")
+        else branch
     )
-    config_tree = baseline.parse().expects("Baseline error")
+    cache_dir = env.get_else("baseline_cache_dir", "")
+    cached = get_cached_baseline(baseline_version, cache_dir)
+    if cached is None:
+        with timed("baseline.parse"):
+            parsed = baseline.parse()
+        config_tree = parsed.expects("Baseline error")
+        cached = (config_tree, baseline_version)
+        store_cached_baseline(cached, cache_dir)
+    else:
+        logger.info("Reusing parsed baseline %s", baseline_version)
+    return cached
 
-    print(baseline_version)
-    return config_tree, baseline_version
+def get_payload_store(env):
+    """Claim-check store for large payloads, None when payload_store_dir is unset"""
+    root = env.get_else("payload_store_dir", "")
+    return PayloadStore(root) if root else None
+
+def offload_payload(env, payload, order_id=None):
+    """Store a large payload and return its reference, or the payload itself"""
+    store = get_payload_store(env)
+    if store is None:
+        return payload
+    return store.put(payload, order_id)
+
+def release_payloads(env, order_id):
+    store = get_payload_store(env)
+    if store is None:
+        return
+    try:
+        released = store.release(order_id)
+        released += store.collect(PAYLOAD_MAX_AGE)
+    except OSError as e:
+        logger.warning("Failed to release payloads for %s: %s", order_id, e)
+        return
+    logger.info("Released %d payloads for %s", released, order_id)
+
+def get_cached_baseline(baseline_version, cache_dir=""):
+    """Parsed baseline for a version from memory, then from cache_dir"""
+    cached = baseline_version_cache.get(baseline_version)
+    if cached is not None or not cache_dir:
+        return cached
+    path = baseline_cache_path(cache_dir, baseline_version)
+    try:
+        with open(path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable baseline cache %s: %s", path, e)
+        return None
+    baseline_version_cache.put(baseline_version, cached)
+    return cached
+
+def store_cached_baseline(cached, cache_dir=""):
+    _, baseline_version = cached
+    baseline_version_cache.put(baseline_version, cached)
+    if not cache_dir:
+        return
+    path = baseline_cache_path(cache_dir, baseline_version)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as tmp_file:
+            pickle.dump(cached, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file.name, path)
+    except OSError as e:
+        logger.warning("Failed to persist baseline cache %s: %s", path, e)
+
+def baseline_cache_path(cache_dir, baseline_version):
+    digest = hashlib.sha256(baseline_version.encode()).hexdigest()
+    return os.path.join(cache_dir, f"baseline-{digest}.pickle")
+
+def invalidate_baseline_cache(branch=None):
+    """Drop cached baselines for one branch, or everything on this worker"""
+    if branch is None:
+        baseline_branch_cache.clear()
+        baseline_version_cache.clear()
+        return
+    cached = baseline_branch_cache.get(branch)
+    baseline_branch_cache.invalidate(branch)
+    if cached is not None:
+        baseline_version_cache.invalidate(cached[1])
 
 @shared_task(name=TaskName.SEND_PBV_REPORT, bind=True)
+@timed_task
 def send_pbv_report(self, *args, **kwargs):
     data = kwargs.get("data")
     toolkit = ToolKitAPI(self.env)
@@ -126,34 +343,364 @@ def send_pbv_report(self, *args, **kwargs):
 
 
 @shared_task(name=TaskName.CLUSTER_MODULE, bind=True)
+@timed_task
 def cluster_module(self, data_results, data):
     params = {"cluster_name": data["request"]["target_cluster"]}
     baseline, extra_vars = extract_results_from_data_collection(data_results)
-    return run_vmware_module(baseline, extra_vars, data, VmwareModule, ESXiValidator, params)
+    return run_vmware_module(
+        baseline, extra_vars, data, VmwareModule, ESXiValidator, params,
+        validation_cache=get_validation_cache(self.env, data),
+    )
 
 @shared_task(name=TaskName.VCENTER_MODULE, bind=True)
+@timed_task
 def vcenter_module(self, data_results, data):
     baseline, extra_vars = extract_results_from_data_collection(data_results)
-    return run_vmware_module(baseline, extra_vars, data, VmwareModule, VcenterValidator, {})
+    return run_vmware_module(
+        baseline, extra_vars, data, VmwareModule, VcenterValidator, {},
+        validation_cache=get_validation_cache(self.env, data),
+    )
 
 @shared_task(name=TaskName.ESXI_MODULE, bind=True)
+@timed_task
 def esxi_module(self, data_results, data):
     params = {"cluster_name": data["request"]["target_cluster"]}
     baseline, extra_vars = extract_results_from_data_collection(data_results)
-    return run_vmware_module(baseline, extra_vars, data, VmwareModule, ESXiHostValidator, params)
+    sharded = fan_out_vmware_module(data_results, data, extra_vars, "esxi", params)
+    if sharded:
+        raise self.replace(sharded)
+    return run_vmware_module(
+        baseline, extra_vars, data, VmwareModule, ESXiHostValidator, params,
+        validation_cache=get_validation_cache(self.env, data), per_host=True,
+        **get_host_concurrency(self.env, data),
+    )
 
-def run_vmware_module(baseline, extra_vars, data, module, validator, params):
+@shared_task(name=TaskName.VMWARE_MODULE_SHARD, bind=True)
+@timed_task
+def vmware_module_shard(self, data_results, data, module_name, params):
+    """Validate one host shard, results are saved by merge_module_shards"""
+    baseline, extra_vars = extract_results_from_data_collection(data_results)
+    module = build_vmware_module(baseline, extra_vars, data, VmwareModule, params)
+    validator = MODULE_VALIDATORS[module_name]
+    with timed(f"module.{module_name}.shard"):
+        ran = module.run(validator)
+    return ran.expects(f"{module_name} shard {params['hosts']} failed")
+
+@shared_task(name=TaskName.MERGE_MODULE_SHARDS, bind=True)
+@timed_task
+def merge_module_shards(self, shard_results, data_results, data, params):
+    """Chord callback: combine the shard results and save them once"""
+    baseline, extra_vars = extract_results_from_data_collection(data_results)
+    module = build_vmware_module(baseline, extra_vars, data, VmwareModule, params)
+    with timed("module.save"):
+        saved = Ok(merge_shard_results(shard_results)) >> module.save
+    return saved.expects("Module run failed")
+
+def fan_out_vmware_module(data_results, data, extra_vars, module_name, params):
+    """
+    Build a chord of per-shard module runs when the request sets
+    `shard_size`, returns None when the report should run in one task.
+    """
+    shard_size = data["request"].get("shard_size")
+    if not shard_size:
+        return None
+    extra_vars_class = load_extra_vars(extra_vars)
+    hosts = get_cluster_hosts(extra_vars_class, params["cluster_name"])
+    shards = shard_hosts(hosts, int(shard_size))
+    if len(shards) < 2:
+        return None
+
+    logger.info(
+        "Fanning out %s module over %d hosts in %d shards",
+        module_name, len(hosts), len(shards),
+    )
+    header = group(
+        vmware_module_shard.s(data_results, data, module_name, dict(params, hosts=shard))
+        for shard in shards
+    )
+    return chord(header, merge_module_shards.s(data_results, data, params))
+
+def get_cluster_hosts(extra_vars, cluster_name):
+    """Host names of `cluster_name` from the extra_vars cluster info"""
+    return list(get_cluster_host_entries(extra_vars, cluster_name))
+
+def get_cluster_host_entries(extra_vars, cluster_name):
+    """Host name -> that host's slice of the extra_vars cluster info"""
+    for cluster in extra_vars.get_clusters() or []:
+        if cluster.get("name") == cluster_name:
+            return {cluster_host_name(host): host for host in cluster.get("hosts") or []}
+    return {}
+
+def cluster_host_name(host):
+    return host.get("name") if isinstance(host, dict) else host
+
+class HostScopedExtraVars:
+    """
+    Read-only view of a shared ExtraVars whose info for `cluster_name` only
+    lists `hosts`. Modules find their targets through get_clusters(), so a
+    module built on this view validates just those hosts. The host entries
+    are copies, modules running in parallel threads never share them, the
+    rest of the shared ExtraVars must only be read.
+    """
+
+    def __init__(self, extra_vars, cluster_name, hosts):
+        self._extra_vars = extra_vars
+        self._cluster_name = cluster_name
+        self._hosts = set(hosts)
+
+    def __getattr__(self, name):
+        return getattr(self._extra_vars, name)
+
+    def get_clusters(self):
+        clusters = self._extra_vars.get_clusters() or []
+        return [
+            dict(cluster, hosts=[
+                copy.deepcopy(host) for host in cluster.get("hosts") or []
+                if cluster_host_name(host) in self._hosts
+            ])
+            if cluster.get("name") == self._cluster_name else cluster
+            for cluster in clusters
+        ]
+
+def shard_hosts(hosts, shard_size):
+    return [hosts[i:i + shard_size] for i in range(0, len(hosts), shard_size)]
+
+def merge_shard_results(shard_results):
+    """
+    Merge per-shard module results, dicts keyed by target or lists.
+    Shards cover disjoint hosts, a target reported by two shards raises
+    ValueError instead of one result silently replacing the other.
+    """
+    if all(isinstance(r, dict) for r in shard_results):
+        merged = {}
+        for result in shard_results:
+            duplicates = merged.keys() & result.keys()
+            if duplicates:
+                raise ValueError(f"Targets reported by more than one shard: {sorted(duplicates)}")
+            merged.update(result)
+        return merged
+    merged = []
+    for result in shard_results:
+        merged.extend(result)
+    return merged
+
+def load_extra_vars(extra_vars_dump):
+    """
+    Parsed ExtraVars for a dump or a payload reference. The returned object
+    is shared, do not mutate it.
+
+    References are keyed on their content digest, so every task on this
+    worker that receives the same stored payload reuses one parse. Inline
+    dumps are keyed on the identity of the dump object and only hit again
+    for that same object within a task, hashing a multi-MB dump would cost
+    about as much as parsing it. Set payload_store_dir to share the parse
+    of large dumps across tasks.
+    """
+    if is_payload_ref(extra_vars_dump):
+        key, owner = extra_vars_dump[REF_KEY], None
+    else:
+        # the entry keeps the dump alive, its id cannot be reused while cached
+        key, owner = ("inline", id(extra_vars_dump)), extra_vars_dump
+    cached = extra_vars_cache.get(key)
+    if cached is not None and cached[0] is owner:
+        return cached[1]
+    json_string = str(resolve_payload(extra_vars_dump))
+    extra_vars = ExtraVars()
+    extra_vars.load(json_string=json_string)
+    extra_vars_cache.put(key, (owner, extra_vars), size=len(json_string))
+    return extra_vars
+
+def build_vmware_module(baseline, extra_vars, data, module, params):
+    """
+    Module for one report stage. `params["hosts"]` restricts the run to
+    those hosts of `params["cluster_name"]` (shards, changed or concurrent
+    hosts): the module gets a HostScopedExtraVars instead of the full
+    cluster info, `hosts` itself is not passed on to the module.
+    """
+    return make_vmware_module(resolve_payload(baseline), load_extra_vars(extra_vars), data, module, params)
+
+def make_vmware_module(baseline, extra_vars_class, data, module, params):
+    """build_vmware_module for an already resolved baseline and parsed ExtraVars"""
     host = data["request"]["host"]
-    extra_vars_class = ExtraVars()
-    extra_vars_class.load(json_string=str(extra_vars))
+    if params.get("hosts") is not None:
+        extra_vars_class = HostScopedExtraVars(extra_vars_class, params.get("cluster_name"), params["hosts"])
+        params = {key: value for key, value in params.items() if key != "hosts"}
     module_data = data.copy()
     module_data.update({"extra_vars": extra_vars_class})
-    module = module(
+    return module(
         baseline=baseline,
         data=module_data,
         host=host,
         params=params,
     )
 
-    saved = module.run(validator) >> module.save
-    return saved.expects("Module run failed")
+def get_validation_cache(env, data):
+    """ValidationCache when the request asks for an incremental report"""
+    if not data["request"].get("incremental"):
+        return None
+    root = env.get_else("incremental_cache_dir", "")
+    return ValidationCache(root) if root else None
+
+def get_host_concurrency(env, data):
+    """
+    run_vmware_module kwargs for validating hosts on a thread pool inside the
+    task, enabled by `host_concurrency` in the request
+    """
+    concurrency = data["request"].get("host_concurrency")
+    if not concurrency:
+        return {}
+    return {
+        "concurrency": int(concurrency),
+        "host_timeout": float(env.get_else("module_host_timeout", MODULE_HOST_TIMEOUT)),
+    }
+
+def run_vmware_module(
+    baseline, extra_vars, data, module, validator, params,
+    validation_cache=None, per_host=False, concurrency=None, host_timeout=None,
+):
+    if validation_cache is not None:
+        return run_incremental_module(
+            baseline, extra_vars, data, module, validator, params, validation_cache, per_host,
+            concurrency=concurrency, host_timeout=host_timeout,
+        )
+    hosts = []
+    if concurrency and per_host and params.get("cluster_name"):
+        hosts = get_cluster_hosts(load_extra_vars(extra_vars), params["cluster_name"])
+    if len(hosts) < 2:
+        module = build_vmware_module(baseline, extra_vars, data, module, params)
+        with timed(f"module.{validator.__name__}.run"):
+            ran = module.run(validator)
+        with timed("module.save"):
+            saved = ran >> module.save
+        return saved.expects("Module run failed")
+
+    results, errors = run_hosts_concurrently(
+        baseline, extra_vars, data, module, validator, params, hosts, concurrency, host_timeout
+    )
+    save_module = build_vmware_module(baseline, extra_vars, data, module, params)
+    with timed("module.save"):
+        saved = Ok(results) >> save_module.save
+    saved_value = saved.expects("Module run failed")
+    raise_host_errors(errors)
+    return saved_value
+
+def run_hosts_concurrently(baseline, extra_vars, data, module, validator, params, hosts, concurrency, host_timeout):
+    """
+    module.run(validator) for each host on a thread pool of `concurrency`
+    threads owned by this call, each bounded by `host_timeout` seconds from
+    when it starts. Returns (results, errors): the merged results of the
+    hosts that succeeded and the error of every host that failed or timed
+    out, so one bad host does not discard the rest. The baseline and
+    extra_vars are resolved and parsed once, every host module gets its own
+    HostScopedExtraVars view.
+    """
+    baseline = resolve_payload(baseline)
+    extra_vars_class = load_extra_vars(extra_vars)
+
+    def run_host(host):
+        host_module = make_vmware_module(baseline, extra_vars_class, data, module, dict(params, hosts=[host]))
+        with timed(f"module.{validator.__name__}.host"):
+            ran = host_module.run(validator)
+        if ran.is_err():
+            Err(f"{host}: {ran.err_val}").log()
+        return ran
+
+    logger.info(
+        "Running %s over %d hosts with concurrency %d",
+        validator.__name__, len(hosts), concurrency,
+    )
+    # a pool per call: the shared Result pool is capped at DEFAULT_MAX_WORKERS
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="module-host")
+    try:
+        with timed(f"module.{validator.__name__}.run"):
+            settled = Result.traverse(
+                run_host, hosts, max_workers=concurrency, timeout=host_timeout,
+                executor=executor, settle=True,
+            ).ok_val
+    finally:
+        # hosts that timed out keep their thread until they return
+        executor.shutdown(wait=False, cancel_futures=True)
+    errors = {}
+    for host, ran in zip(hosts, settled):
+        if ran.is_err():
+            errors[host] = ran.err_val
+    if errors:
+        logger.error("%s failed on %d of %d hosts: %s", validator.__name__, len(errors), len(hosts), errors)
+    results = merge_shard_results([ran.ok_val for ran in settled if ran.is_ok()])
+    return results, errors
+
+def raise_host_errors(errors):
+    """Fail the task for the hosts run_hosts_concurrently could not validate"""
+    if errors:
+        Err(errors).expects(f"Module run failed on {len(errors)} hosts")
+
+def run_incremental_module(
+    baseline, extra_vars, data, module, validator, params, validation_cache, per_host,
+    concurrency=None, host_timeout=None,
+):
+    """
+    Re-validate only what changed since the last report for this vCenter.
+
+    Inputs are fingerprinted together with the baseline and the module
+    params: per host slice of the cluster info when `per_host` is set, the
+    whole extra_vars otherwise. The cache is also keyed by params, so each
+    cluster of a vCenter keeps its own entries. Results of unchanged targets
+    are reused from the validation cache, the module runs over the changed
+    hosts only and everything is saved as one result set for the current
+    order. Targets the run returned no results for, or that failed on a
+    concurrent run, are not cached and run again next time; the results of
+    the other hosts are saved and cached before the failure is raised.
+    """
+    vcenter = data["request"]["host"]
+    context_fingerprint = payload_fingerprint([payload_fingerprint(baseline), params])
+    units = {}
+    if per_host:
+        units = get_cluster_host_entries(load_extra_vars(extra_vars), params.get("cluster_name"))
+    if not units:
+        per_host = False
+        units = {WHOLE_TARGET: extra_vars}
+    fingerprints = {
+        target: host_fingerprint(unit, context_fingerprint) for target, unit in units.items()
+    }
+    previous = validation_cache.load(vcenter, validator.__name__, params)
+    unchanged, changed = split_unchanged(fingerprints, previous)
+    logger.info(
+        "Incremental %s run for %s: %d changed, %d reused",
+        validator.__name__, vcenter, len(changed), len(unchanged),
+    )
+
+    results = {}
+    errors = {}
+    if changed and per_host and concurrency and len(changed) > 1:
+        ran, errors = run_hosts_concurrently(
+            baseline, extra_vars, data, module, validator, params, changed, concurrency, host_timeout
+        )
+        results.update(ran)
+    elif changed:
+        run_params = dict(params, hosts=changed) if per_host else params
+        changed_module = build_vmware_module(baseline, extra_vars, data, module, run_params)
+        with timed(f"module.{validator.__name__}.run"):
+            ran = changed_module.run(validator)
+        results.update(ran.expects("Module run failed"))
+    if per_host:
+        for target, target_results in unchanged.items():
+            results[target] = target_results
+    elif not changed:
+        results = unchanged[WHOLE_TARGET]
+
+    save_module = build_vmware_module(baseline, extra_vars, data, module, params)
+    with timed("module.save"):
+        saved = Ok(results) >> save_module.save
+    saved_value = saved.expects("Module run failed")
+
+    if per_host:
+        entries = {
+            target: {"fingerprint": fingerprint, "results": results[target]}
+            for target, fingerprint in fingerprints.items()
+            if target in results
+        }
+    else:
+        entries = {WHOLE_TARGET: {"fingerprint": fingerprints[WHOLE_TARGET], "results": results}}
+    validation_cache.store(vcenter, validator.__name__, entries, params)
+    raise_host_errors(errors)
+    return saved_value
@@ -0,0 +1,181 @@
+"""
+Benchmarks for the PBV report pipeline.
+
+Measures the worker code paths that scale with cluster size on synthetic
+clusters: parsing extra_vars through load_extra_vars, merging shard
+results, formatting and persisting module results into an in-memory
+FakeResultRepository, and the pbv codec. Nothing on these paths is
+mocked. Not collected by the default test run, execute explicitly:
+
+    pytest -s tasks_bench.py
+
+Set PBV_BENCH_OUTPUT to append JSON lines with the measurements and
+PBV_BENCH_MAX_P99_MS to fail when a benchmark's p99 latency exceeds it.
+"""
+import json
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from cca_pbv.library.results.result import Ok, ResultService, ResultBatch
+from cca_pbv.library.results.codec import dumps, loads
+from cca_pbv.workers.payload_store import PayloadStore, set_store_root
+from cca_pbv.workers.tasks import (
+    extra_vars_cache,
+    load_extra_vars,
+    merge_shard_results,
+    shard_hosts,
+)
+
+# worker caches are module level, every benchmark starts from a cold worker
+pytestmark = pytest.mark.usefixtures("clear_worker_caches")
+
+CLUSTER_SIZES = [10, 100, 1000]
+PLUGINS_PER_HOST = 40
+SHARD_SIZE = 25
+ITERATIONS = 20
+
+
+class FakeResultRepository:
+    """In-memory stand-in for ResultRepository"""
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+
+    def bulk_add(self, results):
+        self.rows += len(results)
+        self.batches += 1
+
+
+def synthetic_results(hosts):
+    return {
+        f"esx{h:04}.example.com": [
+            {
+                "tag": f"plugin_{p}",
+                "description": f"Check number {p}",
+                "fail": p % 7 == 0,
+                "fail_data": {"expected": "enabled", "actual": "disabled"} if p % 7 == 0 else None,
+                "pass_data": None if p % 7 == 0 else {"value": "enabled"},
+                "start_time": "2024-01-01T00:00:00",
+                "finish_time": "2024-01-01T00:00:01",
+            }
+            for p in range(PLUGINS_PER_HOST)
+        ]
+        for h in range(hosts)
+    }
+
+
+def synthetic_extra_vars(hosts):
+    return {
+        "vcenter": "vcenter.example.com",
+        "clusters": [{
+            "name": "EXAMPLE_CLUSTER_NAME",
+            "hosts": [{"name": f"esx{h:04}.example.com", "nics": 4} for h in range(hosts)],
+        }],
+    }
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def measure(name, hosts, fn, iterations=ITERATIONS):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        began = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - began)
+    total = time.perf_counter() - start
+    # one extra, untimed run: tracemalloc slows allocation down too much
+    # to be active while latency is measured
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak_alloc = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = {
+        "benchmark": name,
+        "hosts": hosts,
+        "iterations": iterations,
+        "throughput_per_s": iterations / total,
+        "hosts_per_s": iterations * hosts / total,
+        "p50_ms": percentile(latencies, 0.5) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "peak_alloc_mb": peak_alloc / (1024 * 1024),
+    }
+    print(
+        f"{name:<20} {hosts:>5} hosts  {stats['throughput_per_s']:8.1f} runs/s  "
+        f"p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+        f"peak alloc {stats['peak_alloc_mb']:8.1f} MB"
+    )
+    output = os.environ.get("PBV_BENCH_OUTPUT")
+    if output:
+        with open(output, "a") as bench_file:
+            bench_file.write(json.dumps(stats) + "\n")
+    max_p99 = os.environ.get("PBV_BENCH_MAX_P99_MS")
+    if max_p99:
+        assert stats["p99_ms"] <= float(max_p99), f"{name} p99 regression: {stats}"
+    return stats
+
+
+@pytest.fixture()
+def repository():
+    return FakeResultRepository()
+
+
+@pytest.fixture()
+def payload_store(tmp_path):
+    set_store_root(str(tmp_path))
+    yield PayloadStore(str(tmp_path), min_size=0)
+    set_store_root(None)
+
+
+class TestPipelineBenchmarks:
+
+    @pytest.mark.parametrize("hosts", CLUSTER_SIZES)
+    def test_load_extra_vars_parse(self, hosts):
+        dump = synthetic_extra_vars(hosts)
+
+        def parse():
+            extra_vars_cache.clear()
+            return load_extra_vars(dump)
+
+        measure("load_extra_vars", hosts, parse)
+
+    @pytest.mark.parametrize("hosts", CLUSTER_SIZES)
+    def test_load_extra_vars_reference_hit(self, hosts, payload_store):
+        ref = payload_store.put(synthetic_extra_vars(hosts))
+        load_extra_vars(ref)
+        # every task after the first receives its own copy of the reference
+        measure("load_extra_vars_ref", hosts, lambda: load_extra_vars(dict(ref)))
+
+    @pytest.mark.parametrize("hosts", CLUSTER_SIZES)
+    def test_merge_shard_results(self, hosts):
+        results = synthetic_results(hosts)
+        shard_results = [
+            {host: results[host] for host in shard}
+            for shard in shard_hosts(list(results), SHARD_SIZE)
+        ]
+        measure("merge_shard_results", hosts, lambda: merge_shard_results(shard_results))
+
+    @pytest.mark.parametrize("hosts", CLUSTER_SIZES)
+    def test_save_results(self, hosts, repository):
+        results = synthetic_results(hosts)
+        result_service = ResultService(result_repository=repository)
+        stats = measure(
+            "save_results", hosts,
+            lambda: result_service.save_results(ResultBatch.from_results(results, f"bench-{hosts}", "esxi")),
+        )
+        assert repository.rows == (stats["iterations"] + 1) * hosts * PLUGINS_PER_HOST
+
+    @pytest.mark.parametrize("hosts", CLUSTER_SIZES)
+    def test_codec_round_trip(self, hosts):
+        pytest.importorskip("msgpack")
+        result = Ok(synthetic_results(hosts))
+        measure("codec_round_trip", hosts, lambda: loads(dumps(result)))
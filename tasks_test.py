@@ -1,12 +1,20 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 import pytest
-from celery import Celery
 
-from cca_pbv.library.environment import Envars
-from cca_pbv.library.hashivault import Hashivault
-from cca_pbv.application_container import Application
-from cca_pbv.library.models.report_models import ReportResponse
-from cca_pbv.library.result import Ok, Err
+from cca_pbv.library.models.report_models import ReportResponse, ReportState
+from cca_pbv.library.results.result import (
+    Ok, Err, Result, AwaitableResult, AsyncResult, ResultService,
+    enable_bind_tracing, disable_bind_tracing, iter_result_records, format_results, stream_results,
+)
+from cca_pbv.library.maybe import Some, Nothing, AsyncMaybe, MaybeArray
 from cca_pbv.workers.tasks import (
     report,
     esxi_module,
@@ -14,33 +22,35 @@ from cca_pbv.workers.tasks import (
     cluster_module,
     retrieve_vsphere_config,
     save_metadata,
+    merge_module_shards,
+    merge_shard_results,
+    vmware_module_shard,
+    get_cluster_hosts,
+    shard_hosts,
+    load_extra_vars,
+    invalidate_baseline_cache,
+    retrieve_extra_vars,
 )
-from cca_pbv.workers.base import BaseTask
-
+from cca_pbv.workers.cache import SingleFlight
+from cca_pbv.workers.status_buffer import ReportStatusBuffer, is_terminal
+from cca_pbv.workers import payload_store
+from cca_pbv.workers.incremental import ValidationCache
+from cca_pbv.workers.payload_store import PayloadStore, is_payload_ref, resolve_payload, set_store_root
+from cca_pbv.workers.instrumentation import MetricsRegistry, timed, render_prometheus, serve_metrics
+from cca_pbv.library.results import codec
+from cca_pbv.library.validations.esxi import prepare_result
 
-@pytest.fixture()
-def container():
-    container = Application()
-    hashi_mock = MagicMock(spec=Hashivault)
-    envars_mock = MagicMock(spec=Envars)
-    container.core.hashi.override(hashi_mock)
-    container.core.environment.override(envars_mock)
-    container.wire(modules=["cca_pbv.workers.base"])
-    yield container, hashi_mock, envars_mock
-    container.unwire()
+# worker caches are module level, every test starts from a cold worker
+pytestmark = pytest.mark.usefixtures("clear_worker_caches")
 
 
 @pytest.fixture()
-def test_celery_app(container):
-    app = Celery()
-    app.conf.update(
-        broker_url="memory://",
-        result_backend="cache+memory://",
-        task_always_eager=True,
-        task_eager_propagate=True,
-    )
-    app.task_cls = BaseTask
-    return app
+def payload_store_root(tmp_path):
+    set_store_root(str(tmp_path))
+    payload_store._decoded.clear()
+    yield tmp_path
+    set_store_root(None)
+    payload_store._decoded.clear()
 
 
 class TestTasks:
@@ -57,6 +67,7 @@ class TestTasks:
             "bitbucket_user": "user",
             "bitbucket_token": "token",
         }
+        envars_mock.get_else.side_effect = lambda key, default=None: envars_mock.variables.get(key, default)
         yield
 
     @patch("cca_pbv.library.baseline.BaselineConfig.pull")
@@ -71,6 +82,25 @@ class TestTasks:
         result = retrieve_vsphere_config.delay()
         assert result.get() == ({}, "test")
 
+    @patch("cca_pbv.library.baseline.BaselineConfig.pull")
+    @patch("cca_pbv.library.baseline.BaselineConfig.parse")
+    @patch("cca_pbv.library.baseline.BaselineConfig.get_baseline_version")
+    def test_retrieve_vsphere_config_cached(
+        self, baseline_version, baseline_parse, baseline_pull, baseline_mock
+    ):
+        baseline_pull.return_value = Ok(True)
+        baseline_parse.return_value = Ok({"cached": True})
+        baseline_version.return_value = b"test"
+        assert retrieve_vsphere_config.delay().get() == ({"cached": True}, "test")
+        assert retrieve_vsphere_config.delay().get() == ({"cached": True}, "test")
+        assert baseline_pull.call_count == 1
+        assert baseline_parse.call_count == 1
+
+        invalidate_baseline_cache("bitbucket_branch")
+        assert retrieve_vsphere_config.delay().get() == ({"cached": True}, "test")
+        assert baseline_pull.call_count == 2
+        assert baseline_parse.call_count == 2
+
     @patch("cca_pbv.library.baseline.BaselineConfig.pull")
     def test_retrieve_vsphere_config_failed_pull(
         self, baseline_pull, baseline_mock, test_celery_app
@@ -190,6 +220,346 @@ class TestTasks:
             cluster_module.delay(results, data).get()
         assert "Failure to run module" in str(excinfo.value)
 
+    @patch("cca_pbv.workers.tasks.ExtraVars")
+    def test_retrieve_extra_vars_shared_within_window(self, mock_extra_vars, monkeypatch, test_celery_app, container):
+        monkeypatch.setattr(retrieve_extra_vars, "app", test_celery_app)
+        _, _, envars_mock = container
+        envars_mock.get_else.side_effect = lambda key, default=None: default
+        mock_extra_vars.return_value.dump.return_value = {"vcenter": "dump"}
+        data = {"request": {"host": "hostname.sdi.corp.bankofamerica.com", "job_id": "job"}}
+
+        assert retrieve_extra_vars.delay(data).get() == {"vcenter": "dump"}
+        assert retrieve_extra_vars.delay(data).get() == {"vcenter": "dump"}
+        mock_extra_vars.return_value.load.assert_called_once()
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_esxi_module_incremental_reuses_unchanged_hosts(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        tmp_path, monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(esxi_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        settings = {"incremental_cache_dir": str(tmp_path)}
+        envars_mock.get_else.side_effect = lambda key, default=None: settings.get(key, default)
+        extra_vars_load.return_value = {}
+        hosts = [{"name": "esx01", "nics": 2}, {"name": "esx02", "nics": 2}]
+        get_clusters.return_value = [{"name": "EXAMPLE_CLUSTER_NAME", "hosts": hosts}]
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "incremental": True,
+            }
+        }
+
+        vmware_module_run.return_value = Ok({"esx01": [{"tag": "a"}], "esx02": [{"tag": "a"}]})
+        assert esxi_module.delay([{}, {}], data).get() is True
+
+        hosts[1]["nics"] = 4
+        vmware_module_run.return_value = Ok({"esx02": [{"tag": "b"}]})
+        assert esxi_module.delay([{}, {}], data).get() is True
+        vmware_module_save.assert_called_with({"esx01": [{"tag": "a"}], "esx02": [{"tag": "b"}]})
+
+        vmware_module_run.reset_mock()
+        assert esxi_module.delay([{}, {}], data).get() is True
+        vmware_module_run.assert_not_called()
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_cluster_module_incremental_keeps_clusters_apart(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        tmp_path, monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(cluster_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        settings = {"incremental_cache_dir": str(tmp_path)}
+        envars_mock.get_else.side_effect = lambda key, default=None: settings.get(key, default)
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "CLUSTER_A", "hosts": [{"name": "esx01"}]},
+            {"name": "CLUSTER_B", "hosts": [{"name": "esx02"}]},
+        ]
+        vmware_module_save.return_value = Ok(True)
+
+        def request(cluster):
+            return {
+                "request": {
+                    "target_cluster": cluster,
+                    "host": "hostname.sdi.corp.bankofamerica.com",
+                    "incremental": True,
+                }
+            }
+
+        vmware_module_run.return_value = Ok({"CLUSTER_A": [{"tag": "a"}]})
+        assert cluster_module.delay([{}, {}], request("CLUSTER_A")).get() is True
+        vmware_module_run.return_value = Ok({"CLUSTER_B": [{"tag": "b"}]})
+        assert cluster_module.delay([{}, {}], request("CLUSTER_B")).get() is True
+        assert vmware_module_run.call_count == 2
+        vmware_module_save.assert_called_with({"CLUSTER_B": [{"tag": "b"}]})
+
+        assert cluster_module.delay([{}, {}], request("CLUSTER_A")).get() is True
+        assert vmware_module_run.call_count == 2
+        vmware_module_save.assert_called_with({"CLUSTER_A": [{"tag": "a"}]})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_esxi_module_incremental_reruns_hosts_without_results(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        tmp_path, monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(esxi_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        settings = {"incremental_cache_dir": str(tmp_path)}
+        envars_mock.get_else.side_effect = lambda key, default=None: settings.get(key, default)
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}]}
+        ]
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "incremental": True,
+            }
+        }
+
+        vmware_module_run.return_value = Ok({"esx01": [{"tag": "a"}]})
+        assert esxi_module.delay([{}, {}], data).get() is True
+
+        vmware_module_run.return_value = Ok({"esx02": [{"tag": "a"}]})
+        assert esxi_module.delay([{}, {}], data).get() is True
+        assert vmware_module_run.call_count == 2
+        vmware_module_save.assert_called_with({"esx01": [{"tag": "a"}], "esx02": [{"tag": "a"}]})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_esxi_module_host_concurrency(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(esxi_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        envars_mock.get_else.side_effect = lambda key, default=None: default
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}]}
+        ]
+        vmware_module_run.side_effect = [Ok({"esx01": []}), Ok({"esx02": []})]
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "host_concurrency": 2,
+            }
+        }
+        assert esxi_module.delay([{}, {}], data).get() is True
+        assert vmware_module_run.call_count == 2
+        vmware_module_save.assert_called_once_with({"esx01": [], "esx02": []})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_esxi_module_host_concurrency_saves_hosts_that_succeeded(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        tmp_path, monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(esxi_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        settings = {"incremental_cache_dir": str(tmp_path)}
+        envars_mock.get_else.side_effect = lambda key, default=None: settings.get(key, default)
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}]}
+        ]
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "host_concurrency": 2,
+                "incremental": True,
+            }
+        }
+
+        vmware_module_run.side_effect = [Ok({"esx01": []}), Err("host unreachable")]
+        with pytest.raises(Exception, match="host unreachable"):
+            esxi_module.delay([{}, {}], data).get()
+        vmware_module_save.assert_called_once_with({"esx01": []})
+
+        # only the failed host is validated again
+        vmware_module_run.side_effect = [Ok({"esx02": []})]
+        assert esxi_module.delay([{}, {}], data).get() is True
+        assert vmware_module_run.call_count == 3
+        vmware_module_save.assert_called_with({"esx01": [], "esx02": []})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_esxi_module_host_timeout_keeps_other_hosts(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(esxi_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        settings = {"module_host_timeout": 0.2}
+        envars_mock.get_else.side_effect = lambda key, default=None: settings.get(key, default)
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}]}
+        ]
+        vmware_module_save.return_value = Ok(True)
+        release = threading.Event()
+        calls = []
+        lock = threading.Lock()
+
+        def run(validator):
+            with lock:
+                calls.append(validator)
+                first = len(calls) == 1
+            if first:
+                return Ok({"esx01": []})
+            release.wait(5)
+            return Ok({"esx02": []})
+
+        vmware_module_run.side_effect = run
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "host_concurrency": 2,
+            }
+        }
+        try:
+            with pytest.raises(Exception, match="Timed out after 0.2s"):
+                esxi_module.delay([{}, {}], data).get()
+        finally:
+            release.set()
+        vmware_module_save.assert_called_once_with({"esx01": []})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.run")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_cluster_module_is_not_split_by_host(
+        self, vmware_module_save, vmware_module_run, extra_vars_load, get_clusters,
+        monkeypatch, test_celery_app, container
+    ):
+        monkeypatch.setattr(cluster_module, "app", test_celery_app)
+        _, _, envars_mock = container
+        envars_mock.get_else.side_effect = lambda key, default=None: default
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}]}
+        ]
+        vmware_module_run.return_value = Ok({"EXAMPLE_CLUSTER_NAME": []})
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com",
+                "host_concurrency": 2,
+                "shard_size": 1,
+            }
+        }
+        assert cluster_module.delay([{}, {}], data).get() is True
+        vmware_module_run.assert_called_once()
+
+    def test_shard_hosts(self):
+        hosts = ["esx01", "esx02", "esx03", "esx04", "esx05"]
+        assert shard_hosts(hosts, 2) == [["esx01", "esx02"], ["esx03", "esx04"], ["esx05"]]
+        assert shard_hosts(hosts, 10) == [hosts]
+
+    def test_merge_shard_results(self):
+        assert merge_shard_results([{"esx01": [1]}, {"esx02": [2]}]) == {"esx01": [1], "esx02": [2]}
+        assert merge_shard_results([[1], [2, 3]]) == [1, 2, 3]
+
+    def test_merge_shard_results_rejects_overlapping_targets(self):
+        with pytest.raises(ValueError, match="esx02"):
+            merge_shard_results([{"esx01": [1], "esx02": [2]}, {"esx02": [3]}])
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.library.modules.VmwareModule.save")
+    def test_merge_module_shards_saves_once(self, vmware_module_save, extra_vars_load, monkeypatch, test_celery_app):
+        monkeypatch.setattr(merge_module_shards, "app", test_celery_app)
+        extra_vars_load.return_value = {}
+        vmware_module_save.return_value = Ok(True)
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com"
+            }
+        }
+        params = {"cluster_name": "EXAMPLE_CLUSTER_NAME"}
+        shard_results = [{"esx01": []}, {"esx02": []}]
+        result = merge_module_shards.delay(shard_results, [{}, {}], data, params).get()
+        assert result is True
+        vmware_module_save.assert_called_once_with({"esx01": [], "esx02": []})
+
+    @patch("cca_pbv.library.extra_vars.ExtraVars.get_clusters")
+    @patch("cca_pbv.library.extra_vars.ExtraVars.load")
+    @patch("cca_pbv.workers.tasks.VmwareModule")
+    def test_vmware_module_shard_sees_only_its_hosts(
+        self, vmware_module, extra_vars_load, get_clusters, monkeypatch, test_celery_app
+    ):
+        monkeypatch.setattr(vmware_module_shard, "app", test_celery_app)
+        extra_vars_load.return_value = {}
+        get_clusters.return_value = [
+            {"name": "EXAMPLE_CLUSTER_NAME", "hosts": [{"name": "esx01"}, {"name": "esx02"}, {"name": "esx03"}]}
+        ]
+        vmware_module.return_value.run.return_value = Ok({"esx02": []})
+        data = {
+            "request": {
+                "target_cluster": "EXAMPLE_CLUSTER_NAME",
+                "host": "hostname.sdi.corp.bankofamerica.com"
+            }
+        }
+        params = {"cluster_name": "EXAMPLE_CLUSTER_NAME", "hosts": ["esx02"]}
+        assert vmware_module_shard.delay([{}, {}], data, "esxi", params).get() == {"esx02": []}
+
+        module_kwargs = vmware_module.call_args.kwargs
+        assert get_cluster_hosts(module_kwargs["data"]["extra_vars"], "EXAMPLE_CLUSTER_NAME") == ["esx02"]
+        assert module_kwargs["params"] == {"cluster_name": "EXAMPLE_CLUSTER_NAME"}
+
+    @patch("cca_pbv.workers.tasks.ExtraVars")
+    def test_load_extra_vars_reuses_parse_of_same_dump(self, mock_extra_vars):
+        mock_extra_vars.side_effect = lambda: MagicMock()
+        dump = {"vcenter": "vc01"}
+        first = load_extra_vars(dump)
+        second = load_extra_vars(dump)
+        # an equal dump received by another task is a different object
+        other = load_extra_vars({"vcenter": "vc01"})
+
+        assert first is second
+        assert other is not first
+        assert mock_extra_vars.call_count == 2
+        first.load.assert_called_once()
+
+    @patch("cca_pbv.workers.tasks.ExtraVars")
+    def test_load_extra_vars_reuses_parse_of_same_reference(self, mock_extra_vars, payload_store_root):
+        mock_extra_vars.side_effect = lambda: MagicMock()
+        store = PayloadStore(str(payload_store_root), min_size=0)
+        ref = store.put({"vcenter": "vc01"})
+
+        first = load_extra_vars(ref)
+        second = load_extra_vars(dict(ref))
+
+        assert first is second
+        assert mock_extra_vars.call_count == 1
+
     def get_dummy_payload(self):
         request = {
             "host": "testhost.sdi.corp.bankofamerica.com",
@@ -223,3 +593,562 @@ class TestTasks:
         assert metadata.get("baseline_version") == "baseline_version"
         assert metadata.get("vcenter_version") == "vcenter_version"
         assert metadata.get("cluster_info") == "cluster_info"
+        mock_result_service.return_value.update_report_metadata.assert_called_once_with(
+            "dummy_test_id", metadata, save_metadata.name.value
+        )
+
+
+class TestSingleFlight:
+
+    def test_shared_dir_coalesces_across_processes(self, tmp_path):
+        # two SingleFlight objects stand in for two prefork children
+        calls = []
+        started = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return {"vcenter": "dump"}
+
+        first, second = SingleFlight(), SingleFlight()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, "key", fetch, shared_dir=str(tmp_path))
+            started.wait()
+            assert second.do("key", fetch, shared_dir=str(tmp_path)) == {"vcenter": "dump"}
+            assert leader.result() == {"vcenter": "dump"}
+        assert len(calls) == 1
+
+    def test_unpicklable_value_is_returned_in_process(self, tmp_path):
+        value = {"parse": lambda: None}
+
+        assert SingleFlight().do("key", lambda: value, shared_dir=str(tmp_path)) is value
+        assert not [name for name in os.listdir(tmp_path) if not name.endswith(".lock")]
+
+    def test_shared_dir_is_private(self, tmp_path):
+        shared_dir = tmp_path / "flights"
+        shared_dir.mkdir(mode=0o755)
+
+        SingleFlight().do("key", lambda: 1, shared_dir=str(shared_dir))
+
+        assert shared_dir.stat().st_mode & 0o777 == 0o700
+
+
+class TestReportStatusBuffer:
+
+    def test_coalesces_until_terminal_state(self):
+        service = MagicMock()
+        service.update_report_metadata.return_value = Ok(True)
+        status_buffer = ReportStatusBuffer(lambda: service, flush_interval=None)
+
+        status_buffer.update_status("order", "collecting", "retrieve_extra_vars")
+        status_buffer.update_metadata("order", {"baseline_version": "v1"}, "save_metadata")
+        status_buffer.update_status("order", "validating", "cluster_module")
+        service.update_report_state.assert_not_called()
+        assert status_buffer.pending("order")["transitions"] == 2
+
+        assert status_buffer.update_status("order", "success", "send_pbv_report")
+        service.update_report_metadata.assert_called_once_with(
+            "order", {"baseline_version": "v1"}, "save_metadata"
+        )
+        service.update_report_state.assert_called_once_with("order", "success", "send_pbv_report")
+        assert status_buffer.pending("order") is None
+
+    def test_flushes_at_max_pending(self):
+        service = MagicMock()
+        status_buffer = ReportStatusBuffer(lambda: service, flush_interval=None, max_pending=2)
+        status_buffer.update_status("order1", "collecting", "task")
+        status_buffer.update_status("order2", "collecting", "task")
+        assert service.update_report_state.call_count == 2
+
+    def test_terminal_state_is_not_replaced(self):
+        service = MagicMock()
+        status_buffer = ReportStatusBuffer(lambda: service, flush_interval=None)
+
+        assert status_buffer.update_status("order", "success", "send_pbv_report")
+        status_buffer.update_status("order", "validating", "cluster_module")
+        assert status_buffer.pending("order") is None
+        status_buffer.flush()
+        service.update_report_state.assert_called_once_with("order", "success", "send_pbv_report")
+
+    def test_write_through_writes_every_update(self):
+        service = MagicMock()
+        status_buffer = ReportStatusBuffer(lambda: service, flush_interval=None, write_through=True)
+        status_buffer.update_status("order", "collecting", "retrieve_extra_vars")
+        status_buffer.update_status("order", "validating", "cluster_module")
+        assert service.update_report_state.call_count == 2
+
+    def test_service_factory_failure_keeps_updates(self):
+        service = MagicMock()
+        factory = MagicMock(side_effect=[Exception("db down"), service])
+        status_buffer = ReportStatusBuffer(factory, flush_interval=None)
+        status_buffer.update_status("order", "validating", "cluster_module")
+
+        assert status_buffer.flush().is_err()
+        assert status_buffer.pending("order")["status"] == "validating"
+        assert status_buffer.flush()
+        service.update_report_state.assert_called_once_with("order", "validating", "cluster_module")
+
+    def test_failed_write_is_retried(self):
+        service = MagicMock()
+        service.update_report_state.side_effect = [Exception("db down"), None]
+        status_buffer = ReportStatusBuffer(lambda: service, flush_interval=None)
+
+        assert not status_buffer.update_status("order", "failed", "task")
+        assert status_buffer.pending("order")["status"] == "failed"
+        assert status_buffer.flush()
+        assert status_buffer.pending("order") is None
+
+    def test_terminal_states_come_from_report_state(self):
+        assert is_terminal(ReportState.SUCCESS)
+        assert is_terminal(ReportState.FAILED.value)
+        assert not is_terminal("validating")
+
+
+class TestPayloadStore:
+
+    def test_small_payload_is_inlined(self, tmp_path):
+        store = PayloadStore(str(tmp_path))
+        assert store.put({"small": True}, "order") == {"small": True}
+
+    def test_large_payload_roundtrip_and_release(self, payload_store_root):
+        tmp_path = payload_store_root
+        store = PayloadStore(str(tmp_path), min_size=16)
+        payload = {"hosts": [f"esx{i:03}" for i in range(100)]}
+
+        ref = store.put(payload, "order1")
+        assert is_payload_ref(ref)
+        assert store.put(payload, "order2") == ref
+        assert resolve_payload(ref) == payload
+        assert resolve_payload("not a ref") == "not a ref"
+
+        assert store.release("order1") == 0
+        assert store.release("order2") == 1
+        assert not (tmp_path / "blobs" / ref["__payload_ref__"]).exists()
+
+    def test_put_keeps_unowned_blob_alive(self, tmp_path):
+        store = PayloadStore(str(tmp_path), min_size=16)
+        payload = {"baseline": [f"rule{i:03}" for i in range(100)]}
+        ref = store.put(payload)
+        blob = tmp_path / "blobs" / ref["__payload_ref__"]
+        os.utime(blob, (0, 0))
+
+        assert store.put(payload) == ref
+        assert store.collect(60) == 0
+        assert blob.exists()
+
+    def test_reference_root_is_ignored(self, payload_store_root, tmp_path_factory):
+        other_root = tmp_path_factory.mktemp("other")
+        ref = PayloadStore(str(other_root), min_size=0).put({"hosts": ["esx01"]})
+        payload_store._decoded.clear()
+
+        with pytest.raises(FileNotFoundError):
+            resolve_payload(dict(ref, root=str(other_root)))
+
+    @pytest.mark.parametrize("digest", ["../../etc/passwd", "A" * 64, 42])
+    def test_invalid_digest_is_rejected(self, payload_store_root, digest):
+        with pytest.raises(ValueError):
+            resolve_payload({"__payload_ref__": digest})
+
+    def test_collect_expires_unreleased_orders(self, tmp_path):
+        store = PayloadStore(str(tmp_path), min_size=16)
+        ref = store.put({"hosts": [f"esx{i:03}" for i in range(100)]}, "failed-order")
+        digest = ref["__payload_ref__"]
+        for path in (tmp_path / "blobs" / digest, *(tmp_path / "orders").iterdir()):
+            os.utime(path, (0, 0))
+
+        assert store.collect(60) == 1
+        assert not (tmp_path / "orders").exists() or not list((tmp_path / "orders").iterdir())
+
+
+class TestValidationCache:
+
+    def test_entries_are_kept_per_params(self, tmp_path):
+        cache = ValidationCache(str(tmp_path))
+        entries = {"__all__": {"fingerprint": "f", "results": {"CLUSTER_A": []}}}
+        cache.store("vc01", "ESXiValidator", entries, {"cluster_name": "CLUSTER_A"})
+
+        assert cache.load("vc01", "ESXiValidator", {"cluster_name": "CLUSTER_A"}) == entries
+        assert cache.load("vc01", "ESXiValidator", {"cluster_name": "CLUSTER_B"}) == {}
+
+
+class TestInstrumentation:
+
+    def test_timed_records_durations_and_errors(self):
+        metrics = MetricsRegistry()
+        with timed("stage", metrics) as timing:
+            pass
+        with pytest.raises(ValueError):
+            with timed("stage", metrics):
+                raise ValueError("boom")
+
+        snapshot = metrics.snapshot()["stage"]
+        assert snapshot["count"] == 2
+        assert snapshot["errors"] == 1
+        assert timing.elapsed >= 0
+        assert timing.finish_time >= timing.start_time
+        assert 'pbv_duration_seconds_count{name="stage"} 2' in render_prometheus(metrics)
+
+    def test_serve_metrics_binds_to_localhost(self):
+        server = serve_metrics(0, metrics=MetricsRegistry())
+        try:
+            assert server.server_address[0] == "127.0.0.1"
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+@codec.register_enum
+class CodecState(Enum):
+    VALIDATING = "validating"
+
+
+class OtherState(Enum):
+    DONE = "done"
+
+
+class TestCodec:
+
+    @pytest.fixture(autouse=True)
+    def msgpack(self):
+        return pytest.importorskip("msgpack")
+
+    @pytest.mark.parametrize("value", [
+        Ok({"esx01": [{"tag": "ntp", "fail": False}]}),
+        Err("Failure to run module"),
+        Some(Ok([1, 2])),
+        Nothing(),
+    ])
+    def test_result_and_maybe_round_trip(self, value):
+        restored = codec.loads(codec.dumps(value))
+        assert type(restored) is type(value)
+        assert repr(restored) == repr(value)
+
+    def test_plain_values_round_trip(self):
+        value = {
+            "baseline": ("config", "v1"),
+            "start_time": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+            "day": date(2024, 5, 1),
+            1: b"raw",
+        }
+        assert codec.loads(codec.dumps(value)) == value
+
+    def test_registered_enum_round_trips(self):
+        assert codec.loads(codec.dumps([CodecState.VALIDATING])) == [CodecState.VALIDATING]
+
+    def test_unregistered_enum_is_sent_as_value(self):
+        assert codec.loads(codec.dumps(OtherState.DONE)) == "done"
+
+
+class TestResultPickling:
+
+    @pytest.mark.parametrize("value", [
+        Ok({"esx01": [{"tag": "ntp", "fail": False}]}),
+        Err("Failure to run module"),
+        Some(3),
+        Nothing(),
+    ])
+    def test_round_trip(self, value):
+        restored = pickle.loads(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        assert type(restored) is type(value)
+        assert repr(restored) == repr(value)
+
+    def test_slots_leave_no_instance_dict(self):
+        for value in (Ok(1), Err("e"), Some(1), Nothing()):
+            assert not hasattr(value, "__dict__")
+
+
+class TestResultRecords:
+
+    results = {
+        "esx01": [{"tag": "ntp", "fail": False, "pass_data": "ok"}, {"tag": "dns", "fail": True}],
+        "esx02": [{"tag": "ntp", "fail": False}],
+    }
+
+    def test_iter_result_records_is_lazy(self):
+        records = iter_result_records(self.results, "order-1", "esxi")
+        first = next(records)
+        assert (first.target, first.plugin, first.order_id, first.Category) == ("esx01", "ntp", "order-1", "esxi")
+        assert [r.plugin for r in records] == ["dns", "ntp"]
+
+    def test_format_results_matches_iter(self):
+        formatted = format_results(self.results, "order-1", "esxi")
+        assert [(r.target, r.plugin, r.fail) for r in formatted] == [
+            ("esx01", "ntp", False), ("esx01", "dns", True), ("esx02", "ntp", False)
+        ]
+
+    def test_stream_results_writes_in_batches(self):
+        repository = MagicMock()
+        service = ResultService(result_repository=repository, batch_size=2)
+
+        result = stream_results(service, self.results, "order-1", "esxi")
+
+        assert result.is_ok()
+        assert result.ok_val == {"written": 3, "failed": 0}
+        assert [len(call.args[0]) for call in repository.bulk_add.call_args_list] == [2, 1]
+
+    def test_stream_results_counts_failed_batches(self):
+        repository = MagicMock()
+        repository.bulk_add.side_effect = [None, RuntimeError("db down")]
+        service = ResultService(result_repository=repository, batch_size=2)
+
+        result = stream_results(service, self.results, "order-1", "esxi")
+
+        assert result.is_err()
+        assert result.err_val == {"written": 2, "failed": 1}
+
+
+class TestErrLogging:
+
+    def test_err_is_silent_on_creation(self, caplog):
+        with caplog.at_level(logging.ERROR):
+            Err("not logged yet")
+        assert "not logged yet" not in caplog.text
+
+    def test_expects_logs_the_error(self, caplog):
+        with caplog.at_level(logging.ERROR):
+            with pytest.raises(Exception, match="Module run failed: host unreachable"):
+                Err("host unreachable").expects("Module run failed")
+        assert "host unreachable" in caplog.text
+
+
+class TestResultGather:
+
+    def test_gather_keeps_input_order(self):
+        def value(i, delay):
+            time.sleep(delay)
+            return Ok(i)
+
+        gathered = Result.gather([lambda: value(0, 0.05), lambda: value(1, 0), lambda: value(2, 0.02)])
+
+        assert gathered.ok_val == [0, 1, 2]
+
+    def test_traverse_returns_first_err(self):
+        gathered = Result.traverse(lambda i: Err(f"bad {i}") if i == 2 else Ok(i), range(4), max_workers=1)
+
+        assert gathered.err_val == "bad 2"
+
+    def test_traverse_collect_errors_keeps_every_error(self):
+        gathered = Result.traverse(
+            lambda i: Err(f"bad {i}") if i % 2 else Ok(i), range(5), collect_errors=True
+        )
+
+        assert gathered.err_val == ["bad 1", "bad 3"]
+
+    def test_exceptions_become_err(self):
+        def boom():
+            raise RuntimeError("boom")
+
+        assert Result.gather([boom]).err_val == "boom"
+
+    def test_timeout_counts_as_err(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return Ok("late")
+
+        try:
+            gathered = Result.gather([slow, lambda: Ok("fast")], collect_errors=True, timeout=0.2)
+        finally:
+            release.set()
+
+        assert gathered.err_val == ["Timed out after 0.2s"]
+
+    def test_settle_keeps_successes_next_to_errors(self):
+        gathered = Result.traverse(lambda i: Err(f"bad {i}") if i == 1 else Ok(i), range(3), settle=True)
+
+        assert [(r.is_ok(), r.ok_val if r.is_ok() else r.err_val) for r in gathered.ok_val] == [
+            (True, 0), (False, "bad 1"), (True, 2)
+        ]
+
+    def test_settle_reports_timeout_per_call(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return Ok("late")
+
+        try:
+            gathered = Result.gather([slow, lambda: Ok("fast")], timeout=0.2, settle=True)
+        finally:
+            release.set()
+
+        slow_result, fast_result = gathered.ok_val
+        assert slow_result.err_val == "Timed out after 0.2s"
+        assert fast_result.ok_val == "fast"
+
+    def test_max_workers_above_shared_pool(self):
+        workers = 32
+        barrier = threading.Barrier(workers, timeout=5)
+
+        def wait_for_all(i):
+            # only passes when every call is running at the same time
+            barrier.wait()
+            return Ok(i)
+
+        gathered = Result.traverse(wait_for_all, range(workers), max_workers=workers)
+
+        assert gathered.ok_val == list(range(workers))
+
+
+class TestAsyncChains:
+
+    @staticmethod
+    async def double(x):
+        return Ok(x * 2)
+
+    @pytest.mark.asyncio
+    async def test_chain_mixes_sync_and_async_steps(self):
+        chained = AwaitableResult(self.double(2)) >> (lambda x: Ok(x + 1)) >> self.double
+
+        assert (await chained).ok_val == 10
+
+    @pytest.mark.asyncio
+    async def test_err_short_circuits(self):
+        later = MagicMock(return_value=Ok(0))
+
+        chained = AwaitableResult(Err("no host")) >> self.double >> later
+
+        assert (await chained).err_val == "no host"
+        later.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_from_sync_runs_in_thread(self):
+        assert (await AwaitableResult.from_sync(lambda: Ok(threading.current_thread().name))).ok_val != "MainThread"
+
+    @pytest.mark.asyncio
+    async def test_gather(self):
+        gathered = await AwaitableResult.gather(self.double(1), Ok(5), self.double(3))
+
+        assert gathered.ok_val == [2, 5, 6]
+
+    @pytest.mark.asyncio
+    async def test_gather_collect_errors(self):
+        gathered = await AwaitableResult.gather(Err("a"), self.double(1), Err("b"), collect_errors=True)
+
+        assert gathered.err_val == ["a", "b"]
+
+    def test_async_result_alias(self):
+        assert AsyncResult is AwaitableResult
+
+    @pytest.mark.asyncio
+    async def test_async_maybe_chain(self):
+        async def lookup(x):
+            return Some(x + 1)
+
+        assert (await (AsyncMaybe(Some(1)) >> lookup >> (lambda x: Some(x * 10)))).value == 20
+
+    @pytest.mark.asyncio
+    async def test_async_maybe_nothing_short_circuits(self):
+        later = MagicMock(return_value=Some(0))
+
+        chained = AsyncMaybe(Nothing()) >> later
+
+        assert (await chained).is_nothing()
+        later.assert_not_called()
+
+
+class TestMaybeArray:
+
+    @pytest.fixture(autouse=True)
+    def numpy(self):
+        return pytest.importorskip("numpy")
+
+    def test_getitem(self):
+        speeds = MaybeArray.from_optional([10000, None, 25000])
+
+        assert speeds[0].value == 10000
+        assert type(speeds[0].value) is int
+        assert speeds[1].is_nothing()
+        assert speeds[1:].count() == 1
+
+    def test_getitem_object_dtype(self, numpy):
+        hosts = MaybeArray(numpy.array([{"name": "esx01"}, None], dtype=object), [True, False])
+
+        assert hosts[0].value == {"name": "esx01"}
+        assert hosts[1].is_nothing()
+        assert [m.is_nothing() for m in hosts] == [False, True]
+
+    def test_reductions_skip_nothing(self):
+        speeds = MaybeArray.from_optional([1, None, 3])
+
+        assert speeds.sum().value == 4
+        assert speeds.mean().value == 2
+        assert speeds.min().value == 1
+        assert speeds.max().value == 3
+
+    def test_reductions_of_empty_array_are_nothing(self):
+        missing = MaybeArray.from_optional([None, None])
+
+        for reduced in (missing.sum(), missing.mean(), missing.min(), missing.max()):
+            assert reduced.is_nothing()
+
+    def test_bind_combines_masks(self):
+        speeds = MaybeArray.from_optional([1, None, 3])
+
+        bound = speeds >> (lambda values: MaybeArray(values * 2, values != 3))
+
+        assert repr(bound) == "MaybeArray([2, None, None])"
+
+
+class TestPrepareResult:
+
+    def test_default_times_are_utc_datetimes(self):
+        before = datetime.now(timezone.utc)
+        prepared = prepare_result([], "E100", "esxi", "esx01", "env", 2.5).ok_val
+
+        assert isinstance(prepared["finish_time"], datetime)
+        assert before <= prepared["finish_time"] <= datetime.now(timezone.utc)
+        assert prepared["finish_time"] - prepared["start_time"] == timedelta(seconds=2.5)
+
+    def test_given_times_are_kept(self):
+        start = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+        finish = start + timedelta(seconds=3)
+        prepared = prepare_result([], "E100", "esxi", "esx01", "env", 3, start, finish).ok_val
+
+        assert (prepared["start_time"], prepared["finish_time"]) == (start, finish)
+
+
+def parse_config(value):
+    return Ok(value + 1)
+
+
+def validate_config(value):
+    return Ok(value) >> parse_config if value < 10 else Err("too large")
+
+
+class TestBindTracing:
+
+    @pytest.fixture()
+    def tracer(self):
+        tracer = enable_bind_tracing()
+        yield tracer
+        disable_bind_tracing()
+
+    def test_records_nested_spans(self, tracer):
+        assert (Ok(1) >> validate_config).ok_val == 2
+
+        records = tracer.records()
+        stacks = [record["stack"] for record in records]
+        assert [name.rsplit(".", 1)[-1] for name in stacks[0]] == ["validate_config", "parse_config"]
+        assert [name.rsplit(".", 1)[-1] for name in stacks[1]] == ["validate_config"]
+        assert all(record["outcome"] == "ok" for record in records)
+        assert records[1]["duration_ns"] >= records[0]["duration_ns"]
+
+    def test_folded_marks_err_and_raised(self, tracer):
+        def boom(value):
+            raise RuntimeError("boom")
+
+        Ok(10) >> validate_config
+        with pytest.raises(RuntimeError):
+            Ok(1) >> boom
+
+        stacks = [line.rsplit(" ", 1)[0] for line in tracer.folded().splitlines()]
+        assert any(stack.endswith("validate_config [err]") for stack in stacks)
+        assert any(stack.endswith("boom [raised]") for stack in stacks)
+
+    def test_disable_restores_untraced_bind(self, tracer):
+        assert disable_bind_tracing() is tracer
+        Ok(1) >> parse_config
+        assert tracer.records() == []
@@ -1,109 +1,262 @@
-from flask import Flask, render_template, request, Response, stream_with_context
-import subprocess
+from flask import Flask, render_template, request, Response, stream_with_context, jsonify, abort
+import gzip
+import json
 import os
-import time
+import queue
+
+from automation_jobs import FLAVORS, JobRegistry, MatrixRegistry, expand_matrix
+from log_reader import DEFAULT_LINES, read_window
+from log_tail import get_tailer, read_lines
 
 app = Flask(__name__)
 
+# automation runs take hours, keep them off the request threads. Single
+# jobs all run in SCRIPT_DIR and write the same log_filename, so they run
+# one at a time; matrix cells get their own directory below
+jobs = JobRegistry(max_workers=1)
+
+# job_type=all fans out into one job per flavor x model_type x pnics cell
+matrices = MatrixRegistry(
+    os.environ.get("AUTOMATION_MATRIX_DIR", "matrix_runs"),
+    max_parallel=int(os.environ.get("AUTOMATION_MATRIX_PARALLEL", 4)),
+)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def build_command(form, cell=None):
+    # Get form input, a matrix cell overrides the flavor, model and pnics
+    cell = cell or {}
+    appliance_type = form.get('appliance_type')
+    job_env = form.get('job_env')
+    model_type = cell.get('model_type') or form.get('model_type')
+    job_type = cell.get('job_type') or form.get('job_type')
+    pnics = cell.get('pnics') or form.get('pnics')
+    agora_enable = form.get('agora_enable')
+    BACCON = form.get('BACCON') or None
+    destroy = form.get('destroy') or 'yes'
+    extra_vars_file = form.get('extra_vars_file') or None
+    scm_branch = form.get('scm_branch') or None
+    baseline_branch = form.get('baseline_branch') or None
+    # List of selected values, a cell runs one flavor so there is nothing to skip
+    skip_types = [] if cell else form.getlist('skip_types')
+
+    # Determine the script to run based on the appliance type
+    if appliance_type == "vCenter":
+        job_type = form.get('vcenter_type')
+        vcsa_version = form.get('vcsa_version')
+        script_name = "test_vcenter_automation.py"
+    else:
+        script_name = "test_cluster_automation.py"
+    if cell:
+        # cells run in their own directory so each keeps a separate log file,
+        # paths relative to where the server runs have to be made absolute
+        script_name = os.path.join(SCRIPT_DIR, script_name)
+        if extra_vars_file:
+            extra_vars_file = os.path.abspath(extra_vars_file)
+
+    # Construct the command
+    command = [
+        "python", script_name,
+        "--job_env", job_env,
+        "--job_type", job_type,
+        "--destroy", destroy
+    ]
+
+    # Add optional arguments only if they are not None
+    if appliance_type == "vCenter":
+        if vcsa_version:
+            command.extend(["--vcsa_ver", vcsa_version])
+    else:
+        if BACCON:
+            command.extend(["--BACCON", BACCON])
+        if agora_enable:
+            command.extend(["--agora", agora_enable])
+        if pnics:
+            command.extend(["--pnics", pnics])
+        if model_type:
+            command.extend(["--model_type", model_type])
+        if skip_types:
+            command.extend(["--skip_types"] + skip_types)
+        if extra_vars_file:
+            command.extend(["--extra_vars_file", extra_vars_file])
+        if scm_branch:
+            command.extend(["--scm_branch", scm_branch])
+        if baseline_branch:
+            command.extend(["--baseline_branch", baseline_branch])
+    return command
+
+def is_matrix(form):
+    return form.get('appliance_type') != "vCenter" and form.get('job_type') == "all"
+
+def matrix_values(form, field, extra_field):
+    # the single select plus the matrix-only extras, in order without repeats
+    values = [form.get(field)] + form.getlist(extra_field)
+    return list(dict.fromkeys(value for value in values if value)) or [None]
+
+def submit_matrix(form):
+    cells = expand_matrix(
+        FLAVORS,
+        matrix_values(form, 'model_type', 'matrix_model_types'),
+        matrix_values(form, 'pnics', 'matrix_pnics'),
+        skip_types=form.getlist('skip_types'),
+    )
+    return matrices.submit(cells, lambda cell: build_command(form, cell))
+
+def parse_event_id(value, default=-1):
+    # ids come back from the client, a malformed one restarts the stream
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return best == 'application/json'
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        # Get form input
-        appliance_type = request.form.get('appliance_type')
-        job_env = request.form.get('job_env')
-        model_type = request.form.get('model_type')
-        job_type = request.form.get('job_type')
-        pnics = request.form.get('pnics')
-        agora_enable = request.form.get('agora_enable')
-        BACCON = request.form.get('BACCON') or None
-        destroy = request.form.get('destroy') or 'yes'
-        extra_vars_file = request.form.get('extra_vars_file') or None
-        scm_branch = request.form.get('scm_branch') or None
-        baseline_branch = request.form.get('baseline_branch') or None
-        skip_types = request.form.getlist('skip_types')  # List of selected values
-
-        # Determine the script to run based on the appliance type
-        if appliance_type == "vCenter":
-            job_type = request.form.get('vcenter_type')
-            vcsa_version = request.form.get('vcsa_version')
-            script_name = "test_vcenter_automation.py"
-        else:
-            script_name = "test_cluster_automation.py"
-
-        # Construct the command
-        command = [
-            "python", script_name,
-            "--job_env", job_env,
-            "--job_type", job_type,
-            "--destroy", destroy
-        ]
-
-        # Add optional arguments only if they are not None
-        if appliance_type == "vCenter":
-            if vcsa_version:
-                command.extend(["--vcsa_ver", vcsa_version])
-        else:
-            if BACCON:
-                command.extend(["--BACCON", BACCON])
-            if agora_enable:
-                command.extend(["--agora", agora_enable])
-            if pnics:
-                command.extend(["--pnics", pnics])
-            if model_type:
-                command.extend(["--model_type", model_type])
-            if skip_types:
-                command.extend(["--skip_types"] + skip_types)
-            if extra_vars_file:
-                command.extend(["--extra_vars_file", extra_vars_file])
-            if scm_branch:
-                command.extend(["--scm_branch", scm_branch])
-            if baseline_branch:
-                command.extend(["--baseline_branch", baseline_branch])
+        if is_matrix(request.form):
+            matrix = submit_matrix(request.form)
+            if wants_json():
+                return jsonify({'matrix_id': matrix.id, 'cells': len(matrix.cells)}), 202
+            return render_template('index.html', job=None, matrix=matrix.to_dict())
+
+        command = build_command(request.form)
 
         # Debug print to show the constructed command
         print(f"Running command: {' '.join(map(str, command))}")
 
-        # Execute the Python script with subprocess
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
+        # Queue the script, the page polls /jobs/<id> for the outcome
+        job = jobs.submit(command)
+        if wants_json():
+            return jsonify({'job_id': job.id, 'status': job.status}), 202
+        return render_template('index.html', job=job.to_dict(), matrix=None)
+
+    return render_template('index.html', job=None, matrix=None)
 
-        log_filename = "logfile.txt"
-        if os.path.exists(log_filename):
-            with open(log_filename, 'r') as logfile:
-                logfile_content = logfile.read()
-        else:
-            logfile_content = 'logfile does not exist'
+@app.route('/jobs')
+def list_jobs():
+    return jsonify([job.to_dict() for job in jobs.list()])
 
-        # Print stdout and stderr for debugging
-        print(f"Standard Output: {stdout.decode('utf-8')}")
-        print(f"Standard Error: {stderr.decode('utf-8')}")
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
 
-        # Return the output
-        result = {
-            'stdout': stdout.decode('utf-8'),
-            'stderr': stderr.decode('utf-8'),
-            'returncode': process.returncode,
-            'logfile_content': logfile_content
-        }
+@app.route('/jobs/<job_id>/output')
+def job_output(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict(output=True))
 
-        return render_template('index.html', result=result)
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    last_seq = parse_event_id(request.headers.get('Last-Event-ID'))
 
-    return render_template('index.html', result=None)
+    def generate():
+        after = last_seq
+        while True:
+            chunks, closed = job.output.read(after, timeout=15)
+            if not chunks:
+                if closed:
+                    yield f"event: end\ndata: {job.returncode}\n\n"
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for seq, stream, text in chunks:
+                data = "\n".join(f"data: {line}" for line in text.split("\n"))
+                yield f"id: {seq}\nevent: {stream}\n{data}\n\n"
+                after = seq
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
+@app.route('/matrix')
+def list_matrices():
+    return jsonify([{'id': matrix.id, 'summary': matrix.summary()} for matrix in matrices.list()])
+
+@app.route('/matrix/<matrix_id>')
+def matrix_status(matrix_id):
+    matrix = matrices.get(matrix_id)
+    if matrix is None:
+        abort(404)
+    return jsonify(matrix.to_dict())
+
+def window_args():
+    args = request.args
+    return dict(
+        lines=args.get('lines', DEFAULT_LINES),
+        before=args.get('before'),
+        offset=args.get('offset'),
+        line=args.get('line'),
+        grep=args.get('grep'),
+    )
+
+def compressed_json(data):
+    body = json.dumps(data).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    if len(body) > 1024 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# Windowed log access: tail, pages before/after a byte offset, line ranges, grep
+@app.route('/logs')
+def logs():
+    from test_cluster_automation import log_filename
+
+    return log_window(log_filename)
+
+# The same windows over the log of a single matrix cell
+@app.route('/matrix/<matrix_id>/cells/<int:index>/logs')
+def matrix_cell_logs(matrix_id, index):
+    from test_cluster_automation import log_filename
+
+    matrix = matrices.get(matrix_id)
+    if matrix is None or not 0 <= index < len(matrix.cells):
+        abort(404)
+    return log_window(os.path.join(matrix.cells[index].job.cwd, os.path.basename(log_filename)))
+
+def log_window(path):
+    try:
+        result = read_window(path, **window_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if result is None:
+        abort(404)
+    return compressed_json(result)
 
 # New route to stream log file content
 @app.route('/stream_logs')
 def stream_logs():
     from test_cluster_automation import log_filename
 
+    tailer = get_tailer(log_filename)
+    # EventSource resends Last-Event-ID on reconnect, ?from= seeds the first connect
+    last_offset = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('from'), None)
+
     def generate():
-        with open(log_filename, 'r') as logfile:
-            logfile.seek(0, os.SEEK_END)  # Move cursor to the end of the file
+        subscriber, offset = tailer.subscribe()
+        try:
+            # replay what the client missed since its last event
+            if last_offset is not None and 0 <= last_offset < offset:
+                for line_offset, line in read_lines(log_filename, last_offset, offset):
+                    yield f"id: {line_offset}\ndata: {line}\n\n"
             while True:
-                line = logfile.readline()
-                if not line:
-                    time.sleep(1)
+                try:
+                    line_offset, line = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
                     continue
-                yield f"data: {line}\n\n"
+                yield f"id: {line_offset}\ndata: {line}\n\n"
+        finally:
+            tailer.unsubscribe(subscriber)
 
     return Response(stream_with_context(generate()), mimetype="text/event-stream")
 